@@ -6,21 +6,29 @@
 
 import sys
 import os
-import json
 import re
 import pytesseract
-from pdf2image import convert_from_path
-import multiprocessing
 from tqdm import tqdm
 from functools import partial
 import argparse
+import time
+import ocr_engine
+from result_sink import ResultWriter
+from ocr_pool import init_worker, run_pool
+from pdf2image import pdfinfo_from_path
+from raster import RASTER_MODES, iter_pages, render_pages, parse_threshold
+from pdf_index import PdfManifest, read_pdflist, resolve_pdfs, write_missing
+from text_layer import extract_text_layer, is_usable_text
+from ocr_metrics import StageTimer, MetricsCollector
+from task_order import COST_MODES, order_largest_first, print_estimate
+from page_checkpoint import PageCheckpoint, remove_checkpoints
+from front_columns import ocr_columns
 
 
 def ocr_page(img):
     try:
         # print('ocr_image begin...')
-        oem_psm_config = r'--psm 6'
-        text = pytesseract.image_to_string(img, config = oem_psm_config, lang='chi_sim')
+        text = ocr_engine.image_to_string(img, lang='chi_sim', psm=6)
         # print('ocr_image end...')
         # print(f"OCR Result:\n{text[:500]}...\n{'-' * 40}\n")
 
@@ -29,6 +37,14 @@ def ocr_page(img):
         raise RuntimeError(f"Error during OCR: {e}")
 
 
+def ocr_page_with_confidence(img):
+    # 返回 (文本, 单词平均置信度)，用于自适应分辨率
+    try:
+        return ocr_engine.image_to_string_with_confidence(img, lang='chi_sim', psm=6)
+    except Exception as e:
+        raise RuntimeError(f"Error during OCR: {e}")
+
+
 def extract_header(text, num_chars=50):
     """
     提取并预处理页面的页眉部分，用于识别说明书的开始和结束。
@@ -44,51 +60,250 @@ def extract_header(text, num_chars=50):
 
     return cleaned_text.strip()
 
+
+def probe_header(img, band=0.1):
+    """
+    只 OCR 页面顶部 band 比例的条带，返回清洗后的页眉，
+    用于在说明书开始前低成本地判断页面类型，避免整页 OCR 摘要和权利要求书。
+    """
+    strip = img[:max(1, int(img.shape[0] * band))]
+    return extract_header(ocr_page(strip))
+
 # 定义正则表达式模式，允许关键字之间有任意非字母数字字符
 START_PATTERN = re.compile(r'说\s*明\s*书|Description', re.IGNORECASE)
 END_PATTERN = re.compile(r'说\s*明\s*书\s*附\s*图|Drawings', re.IGNORECASE)
 
-def process_pdf(pdf_file, folder_path, finished_pdfs, output_folder):
+
+def description_step(started, header):
+    """
+    说明书起止判断的一步，返回 (新的 started, 本页是否属于说明书, 是否结束)：
+    开始前页眉命中 START_PATTERN 的页面为说明书首页；开始后页眉命中 END_PATTERN（说明书附图）即结束。
+    """
+    if not started:
+        if START_PATTERN.search(header):
+            return True, True, False
+        return False, False, False
+    if END_PATTERN.search(header):
+        return False, False, True
+    return True, True, False
+
+
+def select_description(pages):
+    """
+    pages 为按页码顺序的 (页眉, 页面记录) 可迭代对象，返回属于说明书的页面记录列表，
+    遇到结束页眉后不再读取后续页面。分段任务拼接后用它判断起止，与整份处理的结果一致。
+    """
+    started = False
+    selected = []
+    for header, page in pages:
+        started, include, end = description_step(started, header)
+        if end:
+            break
+        if include:
+            selected.append(page)
+    return selected
+
+
+def build_result(pnr, texts, sources, page_dpis, text_layer=False, adaptive_dpi=None):
+    # 合并所有文本，创建结果字典
+    result = {"pnr": pnr, "description": ''.join(texts).strip()}
+    if text_layer:
+        # 记录说明书每一页的来源：text（文本层）或 ocr
+        result["sources"] = sources
+    if adaptive_dpi:
+        # 记录说明书每一页 OCR 使用的分辨率（文本层页面为 null）
+        result["dpi"] = page_dpis
+    return result
+
+
+# 首页分栏中出现“续页”时第二页也需要分栏 OCR（与 second_pg.py 的筛选条件一致）
+CONTINUATION_PATTERN = re.compile(r'续页', re.IGNORECASE)
+
+# 首页模式下首页 / 续页分栏记录的输出文件，与 reocr_patch_adaptive / reocr_second_pg 的结果文件同名同格式
+FRONTPAGE_FILES = {"frontpage": "frontpage_reocr.json", "second_pg": "frontpage_reocr_second_pg.json"}
+
+# 找不到说明书的 PDF 在 failed 中注明的原因（首页模式下首页分栏照常写出）
+NO_DESCRIPTION = "no description"
+
+
+def ocr_front_page(pdf_path, pnr, timer, images=None, text_layer=False, dpi=400, raster_mode='rgb', threshold=None,
+                   adaptive_dpi=None, min_conf=75):
+    """
+    首页模式：OCR 第一页左右两栏，第一页出现“续页”时再 OCR 第二页左右两栏，
+    返回 {"frontpage": reocr_patch_adaptive 格式的记录, "second_pg": reocr_second_pg 格式的记录或 None}。
+    images 为说明书循环中已按 adaptive_dpi or dpi 渲染的 {页码: 图片}，有则直接裁剪分栏，不再渲染。
+    """
+    images = images or {}
+    column_opts = dict(text_layer=text_layer, dpi=dpi, raster_mode=raster_mode, threshold=threshold,
+                       adaptive_dpi=adaptive_dpi, min_conf=min_conf, timer=timer)
+    texts_1, sources_1, dpis_1 = ocr_columns(pdf_path, 1, image=images.get(1), **column_opts)
+    front = {"pnr": pnr, "left": texts_1["left"], "right": texts_1["right"]}
+    if text_layer:
+        front["sources"] = sources_1
+    if adaptive_dpi:
+        front["dpi"] = dpis_1
+
+    second = None
+    if any(CONTINUATION_PATTERN.search(texts_1[key].replace(" ", "")) for key in ("left", "right")):
+        timer.count('second_pages')
+        texts_2, sources_2, dpis_2 = ocr_columns(pdf_path, 2, image=images.get(2), **column_opts)
+        second = {"pnr": pnr, "left1": texts_1["left"], "right1": texts_1["right"],
+                  "left2": texts_2["left"], "right2": texts_2["right"]}
+        if text_layer:
+            second["sources"] = {"left1": sources_1["left"], "right1": sources_1["right"],
+                                 "left2": sources_2["left"], "right2": sources_2["right"]}
+        if adaptive_dpi:
+            second["dpi"] = {key + page: dpi_used for page, dpis in (("1", dpis_1), ("2", dpis_2))
+                             for key, dpi_used in dpis.items()}
+    return {"frontpage": front, "second_pg": second}
+
+
+def ocr_full_page(pdf_path, page_no, image, timer, dpi=300, raster_mode='rgb', threshold=None,
+                  adaptive_dpi=None, min_conf=75):
+    """
+    整页 OCR，返回 (文本, 使用的分辨率)；
+    自适应模式下图片按 adaptive_dpi 渲染，平均置信度低于 min_conf 时按 dpi 重新渲染该页再 OCR
+    """
+    timer.count('ocr_pages')
+    if not adaptive_dpi:
+        with timer.stage('ocr'):
+            return ocr_page(image), dpi
+    with timer.stage('ocr'):
+        text, conf = ocr_page_with_confidence(image)
+    if conf >= min_conf:
+        return text, adaptive_dpi
+    timer.count('rerendered_pages')
+    with timer.stage('rasterize'):
+        image = render_pages(pdf_path, dpi=dpi, first_page=page_no, last_page=page_no,
+                             mode=raster_mode, threshold=threshold)[0]
+    timer.count('image_bytes', image.nbytes)
+    with timer.stage('ocr'):
+        return ocr_page(image), dpi
+
+
+def load_text_layer(pdf_path, timer, text_layer=False, first_page=1, last_page=None):
+    # 文本层可用的页面直接使用文本层，不再渲染和 OCR；返回 (各页文本, 文本层可用的页码集合)
+    # 只提取 [first_page, last_page] 范围（分段任务不重复提取整份 PDF），各页文本的第一项为 first_page
+    page_texts = []
+    if text_layer:
+        with timer.stage('text_layer'):
+            page_texts = extract_text_layer(pdf_path, first_page=first_page, last_page=last_page)
+    return page_texts, {i for i, page_text in enumerate(page_texts, start=first_page) if is_usable_text(page_text)}
+
+
+def checkpoint_key(text_layer=False, dpi=300, raster_mode='rgb', threshold=None, adaptive_dpi=None, min_conf=75,
+                   probe_band=0.1):
+    # 影响页面文本和页眉的参数，参数变化后旧断点作废
+    return {"text_layer": text_layer, "dpi": dpi, "raster_mode": raster_mode, "threshold": threshold,
+            "adaptive_dpi": adaptive_dpi, "min_conf": min_conf, "probe_band": probe_band}
+
+
+def process_pdf(pdf_file, folder_path, output_folder, page_window=1, probe=False, probe_band=0.1,
+                text_layer=False, dpi=300, raster_mode='rgb', threshold=None, adaptive_dpi=None, min_conf=75,
+                checkpoint_dir=None, prefetch=0, render_threads=1, frontpage=False, frontpage_dpi=400):
     # print(f'process_pdf {pdf_file} start...')
+    # 已完成的 pnr 由主进程在提交前过滤，不再随每个任务传入 finished_pdfs
     pnr = os.path.basename(pdf_file).split('.')[0]
-    if pnr in finished_pdfs:
-        return None, pnr, True  # Already processed
 
     pdf_path = os.path.join(folder_path, pdf_file)
+    # 各阶段耗时和页数、字节数，随结果返回主进程汇总
+    timer = StageTimer()
+    ocr_opts = dict(dpi=dpi, raster_mode=raster_mode, threshold=threshold, adaptive_dpi=adaptive_dpi, min_conf=min_conf)
+    # 页面级断点：已处理的页面不再渲染和 OCR
+    checkpoint = None
+    if checkpoint_dir:
+        checkpoint = PageCheckpoint(checkpoint_dir, pnr, checkpoint_key(text_layer=text_layer, probe_band=probe_band,
+                                                                        **ocr_opts))
+
+    # 首页模式：说明书循环中渲染的第一、二页分辨率与分栏一致时留下来直接裁剪分栏
+    front_opts = dict(text_layer=text_layer, dpi=frontpage_dpi, raster_mode=raster_mode, threshold=threshold,
+                      adaptive_dpi=adaptive_dpi, min_conf=min_conf)
+    keep_front = frontpage and (adaptive_dpi or dpi) == (adaptive_dpi or frontpage_dpi)
+    front_images = {}
 
     try:
-        images = convert_from_path(pdf_path, dpi=300)
-
+        timer.count('pdf_bytes', os.path.getsize(pdf_path))
         description_started = False
         ocr_text = []
-
-        for i, image in enumerate(images):
-            text = ocr_page(image)
-            header = extract_header(text)
-
-            # 检查是否开始说明书
-            if not description_started:
-                if START_PATTERN.search(header):
-                    description_started = True
-                    ocr_text.append(text)
-                continue
+        sources = []
+        page_dpis = []
+
+        done = checkpoint.load() if checkpoint else {}
+        if not probe:
+            # 只有页眉条带、没有整页文本的页面（probe 模式写入）在非 probe 模式下需要重新 OCR
+            done = {page_no: record for page_no, record in done.items() if record[1] is not None}
+
+        page_texts, text_pages = load_text_layer(pdf_path, timer, text_layer)
+
+        pages = iter_pages(pdf_path, dpi=adaptive_dpi or dpi, window=page_window, skip_pages=text_pages | set(done),
+                           mode=raster_mode, threshold=threshold, prefetch=prefetch, render_threads=render_threads,
+                           timer=timer)
+        # rasterize 记录等待渲染结果的耗时（预取时即 OCR 因渲染跟不上而空等的时间），render 记录实际渲染耗时
+        for page_no, image in timer.iterate('rasterize', pages):
+            timer.count('pages')
+            if image is not None:
+                timer.count('image_bytes', image.nbytes)
+                if keep_front and page_no <= 2:
+                    front_images[page_no] = image
+
+            if page_no in done:
+                header, text, source, page_dpi = done[page_no]
+                timer.count('resumed_pages')
+            elif image is None:
+                text, source, page_dpi = page_texts[page_no - 1], 'text', None
+                with timer.stage('header'):
+                    header = extract_header(text)
+            # probe 模式下，说明书开始前只 OCR 页眉条带，命中后再整页 OCR
+            elif probe and not description_started:
+                text, source, page_dpi = None, 'ocr', None
+                with timer.stage('header'):
+                    header = probe_header(image, band=probe_band)
             else:
-                # 检查是否结束说明书
-                if END_PATTERN.search(header):
-                    description_started = False
-                    break
-                else:
-                    ocr_text.append(text)
-
-        if not ocr_text:
+                (text, page_dpi), source = ocr_full_page(pdf_path, page_no, image, timer, **ocr_opts), 'ocr'
+                with timer.stage('header'):
+                    header = extract_header(text)
+
+            # 检查说明书是否开始或结束
+            description_started, include, end = description_step(description_started, header)
+            if include and text is None:
+                if image is None:
+                    # 从断点恢复的 probe 页面没有渲染，这里补渲染
+                    image = render_pages(pdf_path, dpi=adaptive_dpi or dpi, first_page=page_no, last_page=page_no,
+                                         mode=raster_mode, threshold=threshold)[0]
+                text, page_dpi = ocr_full_page(pdf_path, page_no, image, timer, **ocr_opts)
+            if checkpoint and done.get(page_no) != [header, text, source, page_dpi]:
+                checkpoint.append(page_no, [header, text, source, page_dpi])
+
+            if end:
+                break
+            if include:
+                ocr_text.append(text)
+                sources.append(source)
+                page_dpis.append(page_dpi)
+
+        if not ocr_text and probe:
+            # 页眉条带可能漏识别，退回整页 OCR 再试一次，两次的耗时合并计入
+            if checkpoint:
+                checkpoint.close()
+            result, pnr, success, retry_metrics = process_pdf(
+                pdf_file, folder_path, output_folder, page_window=page_window, probe_band=probe_band,
+                text_layer=text_layer, dpi=dpi, raster_mode=raster_mode, threshold=threshold,
+                adaptive_dpi=adaptive_dpi, min_conf=min_conf, checkpoint_dir=checkpoint_dir,
+                prefetch=prefetch, render_threads=render_threads, frontpage=frontpage, frontpage_dpi=frontpage_dpi)
+            timer.merge(retry_metrics)
+            return result, pnr, success, timer.as_dict()
+
+        result = None
+        if ocr_text:
+            result = build_result(pnr, ocr_text, sources, page_dpis, text_layer=text_layer, adaptive_dpi=adaptive_dpi)
+        else:
             print(f"No description section found in {pdf_file}.")
-            return None, pnr, False
-
-        # 合并所有文本
-        full_text = ''.join(ocr_text).strip()
-
-        # 创建结果字典
-        result = {"pnr": pnr, "description": full_text}
+        if frontpage:
+            # 同一任务中输出首页 / 续页分栏，与说明书记录一起写出；找不到说明书时首页分栏照常输出
+            result = {"fulltext": result,
+                      "extra": ocr_front_page(pdf_path, pnr, timer, front_images, **front_opts)}
+        if not ocr_text:
+            return result, pnr, False, timer.as_dict()
 
         # 将结果保存为单个JSON文件
         """
@@ -96,36 +311,142 @@ def process_pdf(pdf_file, folder_path, finished_pdfs, output_folder):
         with open(json_output_path, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=4)
         """
-        return result, pnr, True  # 返回结果, pnr, 成功
+        return result, pnr, True, timer.as_dict()  # 返回结果, pnr, 成功, 各阶段耗时
     except Exception as e:
         print(f"Error processing {pdf_file}: {e}")
-        return None, pnr, False  # 返回 pnr 和失败标志
+        return None, pnr, False, timer.as_dict()  # 返回 pnr 和失败标志
+    finally:
+        if checkpoint:
+            checkpoint.close()
 
-def get_target_pdfs(input_pdf_list, folder_path):
-    # 读取目标 PDF 文件名，仅获取第一列，分隔符为|
-    with open(input_pdf_list, 'r') as f:
-        target_pdfs = {line.strip().split('|')[0] + ".pdf" for line in f}
 
-    pdf_files = []
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            if file in target_pdfs:
-                file_path = os.path.relpath(os.path.join(root, file), folder_path)
-                pdf_files.append(file_path)
-    return pdf_files
-
-def get_all_pdfs(folder_path):
-    # 遍历指定目录及其子目录，获取所有 PDF 文件的相对路径。
-    pdf_files = []
+def process_chunk(chunk, folder_path, output_folder, page_window=1, probe=False, probe_band=0.1,
+                  text_layer=False, dpi=300, raster_mode='rgb', threshold=None, adaptive_dpi=None, min_conf=75,
+                  checkpoint_dir=None, prefetch=0, render_threads=1, frontpage=False, frontpage_dpi=400):
+    """
+    分段任务：chunk 为 (pdf_file, first_page, last_page)，last_page 为 None 表示到最后一页。
+    逐页整页 OCR（分段任务不知道说明书是否已经开始，probe 不适用），
+    返回 ({"chunk": chunk, "pages": [[页眉, 文本, 来源, 分辨率], ...]}, pnr, 成功, 各阶段耗时)，
+    失败时 pages 为 None；结果中带回任务本身，主进程据此找到所属的 PDF。说明书起止由主进程拼接所有分段后判断。
+    首页模式下从第一页开始的分段同时 OCR 首页 / 续页分栏，放在结果的 "extra" 中。
+    """
+    pdf_file, first_page, last_page = chunk
+    pnr = os.path.basename(pdf_file).split('.')[0]
+    pdf_path = os.path.join(folder_path, pdf_file)
+    timer = StageTimer()
+    res = {"chunk": chunk, "pages": None}
+    # 每个分段写自己的断点文件，读取时合并同一 pnr 的所有断点
+    checkpoint = None
+    if checkpoint_dir:
+        checkpoint = PageCheckpoint(checkpoint_dir, pnr, checkpoint_key(text_layer=text_layer, dpi=dpi,
+                                                                        raster_mode=raster_mode, threshold=threshold,
+                                                                        adaptive_dpi=adaptive_dpi, min_conf=min_conf,
+                                                                        probe_band=probe_band),
+                                    part=first_page)
+
+    with_front = frontpage and first_page == 1
+    keep_front = with_front and (adaptive_dpi or dpi) == (adaptive_dpi or frontpage_dpi)
+    front_images = {}
+
+    try:
+        done = checkpoint.load() if checkpoint else {}
+        done = {page_no: record for page_no, record in done.items() if record[1] is not None}
+        page_texts, text_pages = load_text_layer(pdf_path, timer, text_layer, first_page=first_page, last_page=last_page)
+        records = []
+        pages = iter_pages(pdf_path, dpi=adaptive_dpi or dpi, window=page_window, skip_pages=text_pages | set(done),
+                           mode=raster_mode, threshold=threshold, first_page=first_page, last_page=last_page,
+                           prefetch=prefetch, render_threads=render_threads, timer=timer)
+        for page_no, image in timer.iterate('rasterize', pages):
+            timer.count('pages')
+            if page_no in done:
+                records.append(done[page_no])
+                timer.count('resumed_pages')
+                continue
+            if image is None:
+                text, source, page_dpi = page_texts[page_no - first_page], 'text', None
+            else:
+                timer.count('image_bytes', image.nbytes)
+                if keep_front and page_no <= 2:
+                    front_images[page_no] = image
+                (text, page_dpi), source = ocr_full_page(pdf_path, page_no, image, timer, dpi=dpi,
+                                                         raster_mode=raster_mode, threshold=threshold,
+                                                         adaptive_dpi=adaptive_dpi, min_conf=min_conf), 'ocr'
+            with timer.stage('header'):
+                header = extract_header(text)
+            records.append([header, text, source, page_dpi])
+            if checkpoint:
+                checkpoint.append(page_no, [header, text, source, page_dpi])
+
+        if with_front:
+            res["extra"] = ocr_front_page(pdf_path, pnr, timer, front_images, text_layer=text_layer, dpi=frontpage_dpi,
+                                          raster_mode=raster_mode, threshold=threshold, adaptive_dpi=adaptive_dpi,
+                                          min_conf=min_conf)
+        res["pages"] = records
+        return res, pnr, True, timer.as_dict()
+    except Exception as e:
+        print(f"Error processing {pdf_file} pages {first_page}-{last_page or 'end'}: {e}")
+        return res, pnr, False, timer.as_dict()
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+
+def process_task(task, **kwargs):
+    # 进程池的任务入口：字符串为整份 PDF，元组为分段任务
+    if isinstance(task, tuple):
+        return process_chunk(task, **kwargs)
+    return process_pdf(task, **kwargs)
+
+
+def split_tasks(pdf_files, folder_path, chunk_pages, chunks):
+    """
+    页数超过 chunk_pages 的 PDF 拆成 (pdf_file, first_page, last_page) 分段任务，其余原样 yield。
+    最后一段的 last_page 为 None（到最后一页为止）。chunks[pdf_file] 记录每个拆分 PDF 的分段数，供主进程拼接；
+    按相对路径而不是 pnr 记录，不同目录下 pnr 相同的 PDF 各自拼接。
+    """
+    for pdf_file in pdf_files:
+        try:
+            page_count = pdfinfo_from_path(os.path.join(folder_path, pdf_file))["Pages"]
+        except Exception:
+            page_count = 0
+        if page_count <= chunk_pages:
+            yield pdf_file
+            continue
+
+        first_pages = list(range(1, page_count + 1, chunk_pages))
+        chunks[pdf_file] = {"num_chunks": len(first_pages), "parts": {}, "reason": None}
+        for first_page in first_pages:
+            last_page = first_page + chunk_pages - 1
+            yield pdf_file, first_page, (last_page if last_page < page_count else None)
+
+
+def stitch_chunks(pnr, parts, text_layer=False, adaptive_dpi=None):
+    """按页码顺序拼接一个 PDF 的所有分段，用与整份处理相同的起止判断选出说明书，返回结果字典或 None。"""
+    pages = [page for first_page in sorted(parts) for page in parts[first_page]]
+    selected = select_description((header, (text, source, page_dpi)) for header, text, source, page_dpi in pages)
+    if not selected:
+        return None
+    texts, sources, page_dpis = (list(column) for column in zip(*selected))
+    return build_result(pnr, texts, sources, page_dpis, text_layer=text_layer, adaptive_dpi=adaptive_dpi)
+
+def iter_all_pdfs(folder_path):
+    # 遍历指定目录及其子目录，边遍历边 yield 所有 PDF 文件的相对路径。
     for root, _, files in os.walk(folder_path):
         for file in files:
             if file.lower().endswith('.pdf'):
                 # 获取相对路径，以便后续处理
-                rel_path = os.path.relpath(os.path.join(root, file), folder_path)
-                pdf_files.append(rel_path)
-    return pdf_files
-
-def process_pdf_folder(folder_path, output_folder, input_pdf_list=None, num_processes=10):
+                yield os.path.relpath(os.path.join(root, file), folder_path)
+
+def process_pdf_folder(folder_path, output_folder, input_pdf_list=None, num_processes=10, page_window=1,
+                       probe=False, probe_band=0.1, text_layer=False, ocr_backend='pytesseract',
+                       flush_interval=5.0, max_inflight=None, manifest_path=None,
+                       dpi=300, raster_mode='rgb', threshold=None, adaptive_dpi=None, min_conf=75,
+                       metrics_file=None, metrics_interval=30.0,
+                       page_timeout=None, task_timeout=None, max_tasks_per_child=None, max_rss_mb=None,
+                       order='walk', cost='size', sec_per_page=2.0, chunk_pages=None,
+                       checkpoint=False, adaptive=False, max_workers=None, min_free_mb=2048,
+                       scratch_dir=None, prefetch=0, render_threads=1, ocr_cache=None, ocr_cache_mb=1024,
+                       page_store=None, page_store_mb=10240, frontpage=False, frontpage_dpi=400):
     """
     处理指定文件夹中的 PDF 文件。
 
@@ -134,6 +455,47 @@ def process_pdf_folder(folder_path, output_folder, input_pdf_list=None, num_proc
     - output_folder: 输出结果的文件夹路径
     - input_pdf_list: 可选的 pdflist.txt 文件路径
     - num_processes: 并行处理的进程数
+    - page_window: 每次渲染的页数，<=0 表示一次性渲染整份 PDF
+    - probe: 是否先用页眉条带定位说明书，只对说明书页整页 OCR
+    - probe_band: 页眉条带占页面高度的比例
+    - text_layer: 是否优先使用 PDF 自带的文本层，仅对无文本层的页面 OCR
+    - ocr_backend: OCR 后端，pytesseract、tesserocr（每个进程常驻一个引擎）或 pipe（经 stdin/stdout 调用 tesseract，不写临时文件）
+    - flush_interval: 结果文件批量写出的间隔（秒），<=0 表示每条结果立即写出
+    - max_inflight: 同时在途的任务数上限，默认为进程数的 2 倍
+    - manifest_path: 可选的 PDF 清单索引文件路径，给出时增量更新索引并从索引中取 PDF 列表，不再遍历整个目录
+    - dpi: 渲染分辨率
+    - raster_mode: 渲染模式，rgb / gray（直接渲染为灰度）/ binary（灰度后阈值化）
+    - threshold: binary 模式的阈值，0-255 的整数或 'otsu'
+    - adaptive_dpi: 可选的低分辨率，给出时先按该分辨率 OCR，平均置信度低于 min_conf 的页面再按 dpi 重新 OCR
+    - min_conf: 自适应分辨率的置信度阈值（0-100）
+    - metrics_file: 可选的指标文件路径，.prom 结尾写 Prometheus 文本格式，否则追加 JSON lines
+    - metrics_interval: 指标文件的写出间隔（秒）
+    - page_timeout: 单页渲染和单页 OCR 的超时（秒）
+    - task_timeout: 单个 PDF 的墙钟时间上限（秒），超时的 PDF 以 pnr|原因 记入 failed.txt
+    - max_tasks_per_child / max_rss_mb: 工作进程处理满 N 个 PDF 或常驻内存超过上限（MB）后替换
+      （给出 task_timeout / max_tasks_per_child / max_rss_mb 任一项时使用受监管的工作进程）
+    - order: 提交顺序，walk（边遍历边提交）或 largest（预估页数多的先提交，需先取出全部任务）
+    - cost: largest 顺序的成本估计方式，size（文件大小，抽样换算页数）或 pages（逐个读取页数）
+    - sec_per_page: 预估运行时间时每页的耗时（秒），可参考指标文件中的 page_ocr_seconds
+    - chunk_pages: 可选，页数超过该值的 PDF 按 chunk_pages 页一段拆成子任务并行处理，
+      主进程按页码顺序拼接后判断说明书起止，结果与整份处理一致（分段任务不使用 probe）
+    - checkpoint: 是否把已处理页面写入 output_folder/checkpoints/<pnr>.jsonl，重跑（包括 failed 的 PDF）时从断点继续；
+      结果写入 FullText.json 和 finish.txt 后删除对应的断点文件
+    - adaptive: 是否按内存自适应调整进程数：以 num_processes 为初始值，可用内存低于 min_free_mb（MB）时暂停分配新任务，
+      内存充足且所有进程都在忙时逐个增加进程，最多 max_workers 个（默认为 CPU 核数）
+    - scratch_dir: 可选的临时文件目录（例如 /dev/shm），工作进程及 tesseract 的临时文件都放在这里
+    - prefetch: 渲染与 OCR 流水线执行时每个进程最多提前渲染的窗口数（每个窗口 page_window 页），0 表示渲染完一批再 OCR
+    - render_threads: 预取时每个进程同时运行的 pdftoppm 数，渲染阶段的总并发为 num_processes * render_threads，
+      OCR 阶段的并发为 num_processes；可根据指标中 page_rasterize_seconds（OCR 等待渲染）和 page_render_seconds 调整
+    - ocr_cache: 可选的 OCR 结果缓存文件路径（SQLite，建议放在本地磁盘），与 reocr 脚本共用时相同的页面和裁剪区域只识别一次
+    - ocr_cache_mb: OCR 结果缓存的大小上限（MB），超过时淘汰最久未使用的结果
+    - page_store: 可选的渲染结果缓存目录（例如 /dev/shm/pages），与 reocr 脚本共用时同一页面同一分辨率只渲染一次
+    - page_store_mb: 渲染结果缓存的大小上限（MB），超过时删除最久未使用的页面
+    - frontpage: 首页模式，每个 PDF 只打开一次，同时输出说明书（FullText.json）、首页分栏（frontpage_reocr.json，
+      与 reocr_patch_adaptive 格式相同）和出现“续页”时的两页分栏（frontpage_reocr_second_pg.json，与 reocr_second_pg
+      格式相同），三者共用 finish.txt，代替对同一批 PDF 分别运行三个脚本；已有不带首页结果的 finish.txt 时应换一个输出目录。
+      找不到说明书的 PDF 仍写出首页分栏，在 failed.txt 中记为 pnr|no description
+    - frontpage_dpi: 首页分栏的渲染分辨率，与说明书渲染分辨率（或 adaptive_dpi）相同时第一、二页只渲染一次
     """
 
     if not os.path.exists(output_folder):
@@ -153,54 +515,145 @@ def process_pdf_folder(folder_path, output_folder, input_pdf_list=None, num_proc
         finished_pdfs = set(line.strip() for line in file.readlines())
 
     with open(failed_file, 'r') as file:
-        failed_pdfs = set(line.strip() for line in file.readlines())
+        # failed 中可能带有原因（pnr|reason）
+        failed_pdfs = set(line.strip().split('|')[0] for line in file.readlines())
 
-    # 获取 PDF 文件列表
-    if input_pdf_list:
-        pdf_files = get_target_pdfs(input_pdf_list, folder_path)
-    else:
-        pdf_files = get_all_pdfs(folder_path)
+    # 获取 PDF 文件列表（生成器，边遍历目录边提交任务）
+    manifest = None
+    if manifest_path:
+        # 使用清单索引，只重新扫描 mtime 有变化的目录
+        manifest = PdfManifest(manifest_path, folder_path)
+        manifest.update()
 
-    # 过滤已处理的文件
+    missing_pnrs = set()
     if input_pdf_list:
-        # 在使用 pdflist.txt 时，finished_pdfs 应该包含 pnr，不是完整路径
-        pdf_files = [pdf for pdf in pdf_files if os.path.splitext(os.path.basename(pdf))[0] not in finished_pdfs]
+        # 按 pnr 直接推算路径并 stat，推算不到的再查清单索引或遍历目录；已处理的 pnr 在推算前过滤
+        pnrs = [pnr for pnr in read_pdflist(input_pdf_list) if pnr not in finished_pdfs]
+        pdf_files = resolve_pdfs(pnrs, folder_path, missing_pnrs, manifest=manifest)
     else:
-        pdf_files = [pdf for pdf in pdf_files if os.path.splitext(pdf)[0] not in finished_pdfs]
-
-    print(f"总共有 {len(pdf_files)} 个未处理的 PDF 文件。")
-
-    pool = multiprocessing.Pool(num_processes)
-    process_pdf_partial = partial(process_pdf, folder_path=folder_path, finished_pdfs=finished_pdfs, output_folder=output_folder)
-
-    results = []
-    completed_count = 0
-
-    def callback(result):
-        nonlocal completed_count
-        res, pnr, success = result
-        if res:
-            with open(json_file, 'a', encoding='utf-8') as f:
-                json.dump(res, f, ensure_ascii=False)
-                f.write('\n')
+        pdf_files = manifest.iter_pdfs() if manifest else iter_all_pdfs(folder_path)
+        # 过滤已处理的文件（finished 中为 pnr，不是完整路径）
+        pdf_files = (pdf for pdf in pdf_files if os.path.splitext(os.path.basename(pdf))[0] not in finished_pdfs)
+
+    total = None
+    if order == 'largest':
+        # 先取出全部任务按预估页数从大到小排序，大文件不会落在运行末尾
+        sizes = None
+        if manifest and not input_pdf_list:
+            sizes = {rel_path: size for rel_path, pnr, size, _ in manifest.iter_files() if pnr}
+        pdf_files, total_pages = order_largest_first(pdf_files, folder_path, cost=cost, sizes=sizes)
+        total = len(pdf_files)
+        print_estimate(total, total_pages, num_processes, sec_per_page)
+
+    if max_inflight is None:
+        max_inflight = num_processes * 2
+
+    print(f"边遍历目录边提交任务，同时在途的任务数不超过 {max_inflight} 个。")
+
+    # 页数超过 chunk_pages 的 PDF 拆成分段任务，由多个进程并行处理，主进程拼接
+    chunks = {}
+    if chunk_pages:
+        pdf_files = split_tasks(pdf_files, folder_path, chunk_pages, chunks)
+
+    checkpoint_dir = os.path.join(output_folder, "checkpoints") if checkpoint else None
+
+    process_pdf_partial = partial(process_task, folder_path=folder_path, output_folder=output_folder, page_window=page_window,
+                                  probe=probe, probe_band=probe_band, text_layer=text_layer,
+                                  dpi=dpi, raster_mode=raster_mode, threshold=threshold,
+                                  adaptive_dpi=adaptive_dpi, min_conf=min_conf, checkpoint_dir=checkpoint_dir,
+                                  prefetch=prefetch, render_threads=render_threads,
+                                  frontpage=frontpage, frontpage_dpi=frontpage_dpi)
+
+    metrics = MetricsCollector(metrics_file, interval=metrics_interval) if metrics_file else None
+
+    def record(res, pnr, success, reason=None, extra=None):
+        # 登记一个 PDF 的最终结果，extra 为首页模式下的首页 / 续页分栏记录
+        write_start = time.perf_counter()
+        writer.add(res, pnr, success, reason=reason, extra=extra)
+
+        if metrics:
+            metrics.observe('write_seconds', time.perf_counter() - write_start)
+            metrics.inc('pdfs')
+            if not success:
+                metrics.inc('failed_pdfs')
 
         if success:
             finished_pdfs.add(pnr)
-            with open(finish_file, 'a') as f:
-                f.write(pnr + '\n')
         else:
             failed_pdfs.add(pnr)
-            with open(failed_file, 'a') as f:
-                f.write(pnr + '\n')
 
         pbar.update(1)
 
-    with tqdm(total=len(pdf_files), desc="Processing PDFs") as pbar:
-        for pdf_file in pdf_files:
-            pool.apply_async(process_pdf_partial, args=(pdf_file,), callback=callback)
+    def add_chunk(pnr, chunk, pages, reason=None, extra=None):
+        # 分段结果按所属 PDF 的相对路径缓存，所有分段到齐后拼接；任一分段失败则整个 PDF 记为失败
+        pdf_file, first_page, _ = chunk
+        entry = chunks[pdf_file]
+        entry["parts"][first_page] = pages
+        if extra:
+            entry["extra"] = extra
+        if reason and not entry["reason"]:
+            entry["reason"] = reason
+        if len(entry["parts"]) < entry["num_chunks"]:
+            return
+        del chunks[pdf_file]
+
+        if any(parts is None for parts in entry["parts"].values()):
+            record(None, pnr, False, reason=entry["reason"])
+            return
+        result = stitch_chunks(pnr, entry["parts"], text_layer=text_layer, adaptive_dpi=adaptive_dpi)
+        if result is None:
+            print(f"No description section found in {pnr}.")
+        # 与整份处理一致：找不到说明书时记入 failed，首页分栏照常写出
+        record(result, pnr, result is not None, reason=None if result is not None else NO_DESCRIPTION,
+               extra=entry.get("extra"))
+
+    def callback(result):
+        res, pnr, success, task_metrics = result
+        if metrics:
+            metrics.add_task(task_metrics)
+
+        if res is not None and "chunk" in res:
+            add_chunk(pnr, res["chunk"], res["pages"] if success else None, extra=res.get("extra"))
+        elif res is not None and "fulltext" in res:
+            record(res["fulltext"], pnr, success, reason=None if success else NO_DESCRIPTION, extra=res["extra"])
+        else:
+            record(res, pnr, success)
+
+    def on_abort(task, reason):
+        # 超时、工作进程异常退出或任务抛出异常的 PDF 记入 failed，注明原因
+        pdf_file = task[0] if isinstance(task, tuple) else task
+        pnr = os.path.basename(pdf_file).split('.')[0]
+        if metrics:
+            metrics.inc('aborted_tasks')
+
+        if isinstance(task, tuple):
+            add_chunk(pnr, task, None, reason=reason)
+        else:
+            record(None, pnr, False, reason=reason)
+
+    # 结果落盘后删除断点文件
+    on_commit = partial(remove_checkpoints, checkpoint_dir) if checkpoint_dir else None
+    extra_json_files = {name: os.path.join(output_folder, file_name)
+                        for name, file_name in FRONTPAGE_FILES.items()} if frontpage else None
+    with ResultWriter(json_file, finish_file, failed_file, flush_interval=flush_interval, on_commit=on_commit,
+                      extra_json_files=extra_json_files) as writer, \
+            tqdm(total=total, desc="Processing PDFs") as pbar:
+        run_pool(process_pdf_partial, pdf_files, callback, num_processes, max_inflight=max_inflight,
+                 initializer=init_worker,
+                 initargs=(ocr_backend, page_timeout, scratch_dir, ocr_cache, ocr_cache_mb, page_store, page_store_mb),
+                 task_timeout=task_timeout,
+                 max_tasks_per_child=max_tasks_per_child, max_rss_mb=max_rss_mb, on_abort=on_abort,
+                 max_processes=(max_workers or os.cpu_count()) if adaptive else None, min_free_mb=min_free_mb)
+
+    if metrics:
+        metrics.close()
+    if manifest:
+        manifest.close()
 
-        pool.close()
-        pool.join()
+    if input_pdf_list:
+        missing_file = os.path.join(output_folder, "missingpdf.txt")
+        write_missing(missing_file, missing_pnrs)
+        print(f"Missing PNRs have been written to {missing_file}")
 
     print("Processing completed.")
     print(f"Total PDFs processed: {len(finished_pdfs)}")
@@ -225,6 +678,57 @@ def main():
     parser.add_argument('--output', type=str, default='./ocr_results/', help='输出结果存放的文件夹路径')
     parser.add_argument('--workers', type=int, default=10, help='并行处理的进程数，默认=10')
     parser.add_argument('--pdflist', type=str, default=None, help='可选的 PDF 列表文件路径（pdflist.txt）')
+    parser.add_argument('--page_window', type=int, default=1, help='每次渲染的页数，<=0 表示一次性渲染整份 PDF，默认=1')
+    parser.add_argument('--probe', action='store_true', help='先 OCR 页眉条带定位说明书，只对说明书页整页 OCR')
+    parser.add_argument('--probe_band', type=float, default=0.1, help='页眉条带占页面高度的比例，默认=0.1')
+    parser.add_argument('--text_layer', action='store_true', help='优先使用 PDF 自带的文本层，仅对无文本层的页面 OCR')
+    parser.add_argument('--ocr_backend', type=str, default='pytesseract', choices=ocr_engine.BACKENDS,
+                        help='OCR 后端：pytesseract 每张图启动一次 tesseract，tesserocr 每个进程常驻一个引擎，'
+                             'pipe 经 stdin/stdout 调用 tesseract、不写临时文件，默认=pytesseract')
+    parser.add_argument('--flush_interval', type=float, default=5.0, help='结果文件批量写出的间隔（秒），<=0 表示每条立即写出，默认=5')
+    parser.add_argument('--max_inflight', type=int, default=None, help='同时在途的任务数上限，默认=进程数的 2 倍')
+    parser.add_argument('--manifest', type=str, default=None, help='可选的 PDF 清单索引文件路径（SQLite，建议放在本地磁盘），增量更新后代替遍历目录')
+    parser.add_argument('--dpi', type=int, default=300, help='渲染分辨率，默认=300')
+    parser.add_argument('--raster_mode', type=str, default='rgb', choices=RASTER_MODES,
+                        help='渲染模式：rgb / gray（直接渲染为灰度）/ binary（灰度后阈值化），默认=rgb')
+    parser.add_argument('--threshold', type=parse_threshold, default='otsu', help='binary 模式的阈值，0-255 或 otsu，默认=otsu')
+    parser.add_argument('--adaptive_dpi', type=int, default=None,
+                        help='可选的低分辨率：先按该分辨率 OCR，平均置信度低于 --min_conf 的页面再按 --dpi 重新 OCR')
+    parser.add_argument('--min_conf', type=float, default=75, help='自适应分辨率的置信度阈值（0-100），默认=75')
+    parser.add_argument('--metrics_file', type=str, default=None,
+                        help='可选的指标文件路径（各阶段耗时直方图、页数、字节数），.prom 结尾写 Prometheus 文本格式，否则追加 JSON lines')
+    parser.add_argument('--metrics_interval', type=float, default=30.0, help='指标文件的写出间隔（秒），默认=30')
+    parser.add_argument('--page_timeout', type=float, default=None, help='单页渲染和单页 OCR 的超时（秒），默认不限制')
+    parser.add_argument('--task_timeout', type=float, default=None,
+                        help='单个 PDF 的墙钟时间上限（秒），超时杀掉工作进程并把 pnr|原因 记入 failed，默认不限制')
+    parser.add_argument('--max_tasks_per_child', type=int, default=None, help='工作进程处理满 N 个 PDF 后替换，默认不替换')
+    parser.add_argument('--max_rss_mb', type=float, default=None, help='工作进程常驻内存超过该值（MB）后替换，默认不限制')
+    parser.add_argument('--order', type=str, default='walk', choices=('walk', 'largest'),
+                        help='提交顺序：walk 边遍历边提交，largest 预估页数多的先提交并打印预估总页数和运行时间，默认=walk')
+    parser.add_argument('--cost', type=str, default='size', choices=COST_MODES,
+                        help='largest 顺序的成本估计：size 文件大小（抽样换算页数），pages 逐个读取页数，默认=size')
+    parser.add_argument('--sec_per_page', type=float, default=2.0, help='预估运行时间时每页的耗时（秒），默认=2')
+    parser.add_argument('--chunk_pages', type=int, default=None,
+                        help='可选，页数超过该值的 PDF 按该页数分段，由多个进程并行处理后按页码顺序拼接')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='把已处理页面写入输出目录下的 checkpoints/，重跑时从断点继续，结果落盘后删除断点')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='按内存自适应调整进程数：--workers 为初始值，可用内存不足时暂停分配，充足时逐个增加到 --max_workers')
+    parser.add_argument('--max_workers', type=int, default=None, help='自适应模式下的进程数上限，默认=CPU 核数')
+    parser.add_argument('--min_free_mb', type=float, default=2048, help='自适应模式下保留的系统可用内存（MB），默认=2048')
+    parser.add_argument('--scratch_dir', type=str, default=None, help='可选的临时文件目录（例如 /dev/shm），默认使用系统临时目录')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='每个进程提前渲染的窗口数，渲染与 OCR 重叠执行，0 表示不预取，默认=0')
+    parser.add_argument('--render_threads', type=int, default=1, help='预取时每个进程同时运行的 pdftoppm 数，默认=1')
+    parser.add_argument('--ocr_cache', type=str, default=None,
+                        help='可选的 OCR 结果缓存文件路径（SQLite，建议放在本地磁盘），相同的图片和参数不再重复识别')
+    parser.add_argument('--ocr_cache_mb', type=float, default=1024, help='OCR 结果缓存的大小上限（MB），默认=1024')
+    parser.add_argument('--page_store', type=str, default=None,
+                        help='可选的渲染结果缓存目录（例如 /dev/shm/pages），同一页面同一分辨率只渲染一次')
+    parser.add_argument('--page_store_mb', type=float, default=10240, help='渲染结果缓存的大小上限（MB），默认=10240')
+    parser.add_argument('--frontpage', action='store_true',
+                        help='首页模式：每个 PDF 只处理一次，同时输出说明书、首页分栏和续页分栏（frontpage_reocr*.json）')
+    parser.add_argument('--frontpage_dpi', type=int, default=400, help='首页分栏的渲染分辨率，默认=400')
     args = parser.parse_args()
 
     folder_path = args.directory
@@ -236,7 +740,22 @@ def main():
         print(f"指定的 pdflist 文件不存在: {input_pdf_list}", file=sys.stderr)
         sys.exit(1)
 
-    process_pdf_folder(folder_path, output_folder, input_pdf_list=input_pdf_list, num_processes=num_processes)
+    process_pdf_folder(folder_path, output_folder, input_pdf_list=input_pdf_list, num_processes=num_processes,
+                       page_window=args.page_window, probe=args.probe, probe_band=args.probe_band,
+                       text_layer=args.text_layer, ocr_backend=args.ocr_backend,
+                       flush_interval=args.flush_interval, max_inflight=args.max_inflight,
+                       manifest_path=args.manifest, dpi=args.dpi, raster_mode=args.raster_mode,
+                       threshold=args.threshold, adaptive_dpi=args.adaptive_dpi, min_conf=args.min_conf,
+                       metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                       page_timeout=args.page_timeout, task_timeout=args.task_timeout,
+                       max_tasks_per_child=args.max_tasks_per_child, max_rss_mb=args.max_rss_mb,
+                       order=args.order, cost=args.cost, sec_per_page=args.sec_per_page,
+                       chunk_pages=args.chunk_pages, checkpoint=args.checkpoint,
+                       adaptive=args.adaptive, max_workers=args.max_workers, min_free_mb=args.min_free_mb,
+                       scratch_dir=args.scratch_dir, prefetch=args.prefetch, render_threads=args.render_threads,
+                       ocr_cache=args.ocr_cache, ocr_cache_mb=args.ocr_cache_mb,
+                       page_store=args.page_store, page_store_mb=args.page_store_mb,
+                       frontpage=args.frontpage, frontpage_dpi=args.frontpage_dpi)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,287 @@
+"""
+ 吞吐量基准测试：离线生成类似 CN 专利的合成 PDF，按不同进程数和模式运行三个脚本的 process_pdf，
+ 输出 pages/s、PDFs/s、峰值内存和各阶段耗时，结果为 JSON lines，带 git commit，便于跨提交比较。
+
+ 合成 PDF 的结构：
+ - 第 1 页：扉页，顶部著录项目条带，下方左右两栏（著录项目 / 摘要）
+ - 第 2 页：续页，左右两栏
+ - 权利要求书若干页
+ - 说明书若干页（页眉“说明书”）
+ - 说明书附图若干页（页眉“说明书附图”，线条图）
+
+ 每个配置在独立的子进程中运行，峰值内存取该子进程及其进程池工作进程的 ru_maxrss。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import platform
+import subprocess
+import multiprocessing
+from functools import partial
+
+from ocr_metrics import MetricsCollector
+
+
+# 常见的中文字体位置，可用 --font 指定其它字体
+FONT_CANDIDATES = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    '/System/Library/Fonts/STHeiti Light.ttc',
+    '/Library/Fonts/Arial Unicode.ttf',
+]
+
+# 生成正文用的常用字
+COMMON_CHARS = ('的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经'
+                '十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与'
+                '关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研质信装置方法系统')
+
+SCRIPTS = ('OCRFulltext', 'reocr_patch_adaptive', 'reocr_second_pg')
+
+# 模式名 -> (process_pdf 参数, OCR 后端)；各脚本不支持的参数会被跳过
+MODES = {
+    'default': ({}, 'pytesseract'),
+    'gray': ({'raster_mode': 'gray'}, 'pytesseract'),
+    'binary': ({'raster_mode': 'binary', 'threshold': 'otsu'}, 'pytesseract'),
+    'probe': ({'probe': True}, 'pytesseract'),
+    'text_layer': ({'text_layer': True}, 'pytesseract'),
+    'adaptive_dpi': ({'adaptive_dpi': 200}, 'pytesseract'),
+    'tesserocr': ({}, 'tesserocr'),
+}
+
+
+def find_font(font_path=None):
+    if font_path:
+        return font_path
+    for candidate in FONT_CANDIDATES:
+        if os.path.isfile(candidate):
+            return candidate
+    raise SystemExit("No CJK font found, please pass one with --font")
+
+
+def _text_line(rng, length):
+    return ''.join(rng.choice(COMMON_CHARS) for _ in range(length))
+
+
+def _draw_lines(draw, font, rng, box, line_height, chars_per_line):
+    # 在 box (left, top, right, bottom) 内逐行写随机中文
+    left, top, right, bottom = box
+    y = top
+    while y + line_height <= bottom:
+        draw.text((left, y), _text_line(rng, rng.randint(chars_per_line // 2, chars_per_line)), fill=0, font=font)
+        y += line_height
+
+
+def _new_page(width, height):
+    from PIL import Image
+    return Image.new('L', (width, height), 255)
+
+
+def make_patent_pdf(pdf_path, font_path, rng, claim_pages=2, desc_pages=5, drawing_pages=2, resolution=150):
+    """生成一份合成专利 PDF（A4，纯图像，没有文本层），返回页数。"""
+    from PIL import ImageDraw, ImageFont
+
+    width, height = int(8.27 * resolution), int(11.69 * resolution)
+    margin = int(0.8 * resolution)
+    body_font = ImageFont.truetype(font_path, int(resolution * 0.14))
+    header_font = ImageFont.truetype(font_path, int(resolution * 0.2))
+    line_height = int(resolution * 0.24)
+    chars_per_line = (width - 2 * margin) // int(resolution * 0.15)
+    column_chars = chars_per_line // 2 - 2
+    pages = []
+
+    # 扉页：顶部条带 + 左右两栏
+    page = _new_page(width, height)
+    draw = ImageDraw.Draw(page)
+    draw.text((margin, int(height * 0.04)), "(19)中华人民共和国国家知识产权局", fill=0, font=header_font)
+    draw.text((margin, int(height * 0.08)), "(12)发明专利", fill=0, font=header_font)
+    draw.text((int(width * 0.6), int(height * 0.135)), f"(10)授权公告号 CN{rng.randint(100000000, 119999999)}B",
+              fill=0, font=body_font)
+    draw.line((margin, int(height * 0.16), width - margin, int(height * 0.16)), fill=0, width=3)
+    _draw_lines(draw, body_font, rng, (margin, int(height * 0.17), width // 2 - margin // 2, height - margin),
+                line_height, column_chars)
+    draw.text((width // 2 + margin // 2, int(height * 0.17)), "(57)摘要", fill=0, font=header_font)
+    _draw_lines(draw, body_font, rng, (width // 2 + margin // 2, int(height * 0.17) + line_height * 2,
+                                       width - margin, height - margin), line_height, column_chars)
+    pages.append(page)
+
+    # 续页：左右两栏
+    page = _new_page(width, height)
+    draw = ImageDraw.Draw(page)
+    _draw_lines(draw, body_font, rng, (margin, margin, width // 2 - margin // 2, height - margin),
+                line_height, column_chars)
+    _draw_lines(draw, body_font, rng, (width // 2 + margin // 2, margin, width - margin, height - margin),
+                line_height, column_chars)
+    pages.append(page)
+
+    # 权利要求书和说明书：页眉 + 正文
+    for header, count in (("权利要求书", claim_pages), ("说明书", desc_pages)):
+        for i in range(count):
+            page = _new_page(width, height)
+            draw = ImageDraw.Draw(page)
+            draw.text((width // 2 - resolution, margin // 2), f"{header}  {i + 1}/{count}页", fill=0, font=header_font)
+            _draw_lines(draw, body_font, rng, (margin, margin + line_height * 2, width - margin, height - margin),
+                        line_height, chars_per_line)
+            pages.append(page)
+
+    # 说明书附图：页眉 + 线条图
+    for i in range(drawing_pages):
+        page = _new_page(width, height)
+        draw = ImageDraw.Draw(page)
+        draw.text((width // 2 - resolution, margin // 2), f"说明书附图  {i + 1}/{drawing_pages}页", fill=0, font=header_font)
+        for _ in range(rng.randint(5, 12)):
+            x0, y0 = rng.randint(margin, width - 3 * margin), rng.randint(2 * margin, height - 3 * margin)
+            draw.rectangle((x0, y0, x0 + rng.randint(margin, 2 * margin), y0 + rng.randint(margin, 2 * margin)),
+                           outline=0, width=3)
+            draw.text((x0, y0 - line_height), str(rng.randint(1, 99)), fill=0, font=body_font)
+        pages.append(page)
+
+    pages[0].save(pdf_path, "PDF", resolution=resolution, save_all=True, append_images=pages[1:])
+    return len(pages)
+
+
+def generate_dataset(data_dir, num_pdfs, font_path, seed=0, desc_pages=5):
+    """生成 num_pdfs 份合成 PDF，文件名为 CN<9 位号码>B.pdf，返回 pdflist 文件路径。已存在的 PDF 不重新生成。"""
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    pnrs = []
+    for i in range(num_pdfs):
+        pnr = f"CN{100000001 + i}B"
+        pdf_path = os.path.join(data_dir, pnr + ".pdf")
+        # 每份 PDF 的页数和内容由 seed 决定，保证不同提交之间的数据一致
+        pdf_rng = random.Random(rng.random())
+        claim_pages = pdf_rng.randint(1, 3)
+        drawing_pages = pdf_rng.randint(1, 4)
+        if not os.path.exists(pdf_path):
+            make_patent_pdf(pdf_path, font_path, pdf_rng, claim_pages=claim_pages,
+                            desc_pages=pdf_rng.randint(max(1, desc_pages // 2), desc_pages * 2),
+                            drawing_pages=drawing_pages)
+        pnrs.append(pnr)
+
+    pdflist = os.path.join(data_dir, "pdflist.txt")
+    with open(pdflist, 'w') as f:
+        f.write('\n'.join(pnrs) + '\n')
+    return pdflist
+
+
+def git_commit():
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _supported_kwargs(func, kwargs):
+    import inspect
+    params = inspect.signature(func).parameters
+    return {k: v for k, v in kwargs.items() if k in params}
+
+
+def run_one(script, mode, workers, data_dir, output_dir):
+    """在当前进程中运行一个配置，返回结果字典。"""
+    import ocr_engine
+    module = __import__(script)
+    kwargs, backend = MODES[mode]
+    if _supported_kwargs(module.process_pdf, kwargs) != kwargs:
+        # 该脚本不支持这个模式（例如 reocr 脚本没有 probe），不重复测试默认配置
+        return {"script": script, "mode": mode, "workers": workers, "skipped": True}
+
+    pdf_files = sorted(f for f in os.listdir(data_dir) if f.endswith('.pdf'))
+    process = partial(module.process_pdf, folder_path=data_dir, output_folder=output_dir, **kwargs)
+    collector = MetricsCollector(os.devnull, interval=float('inf'))
+    succeeded = 0
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=ocr_engine.init_backend, initargs=(backend,)) as pool:
+        for _, _, success, metrics in pool.imap_unordered(process, pdf_files):
+            succeeded += success
+            collector.add_task(metrics)
+    elapsed = time.perf_counter() - start
+
+    pages = collector.counters.get('pages', 0)
+    stages = {name[len('pdf_'):-len('_seconds')]: round(hist.total, 3)
+              for name, hist in collector.histograms.items() if name.startswith('pdf_')}
+    return {
+        "script": script,
+        "mode": mode,
+        "workers": workers,
+        "kwargs": kwargs,
+        "backend": backend,
+        "pdfs": len(pdf_files),
+        "succeeded": succeeded,
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pdfs_per_sec": round(len(pdf_files) / elapsed, 4),
+        "pages_per_sec": round(pages / elapsed, 4),
+        # Linux 上 ru_maxrss 的单位是 KB
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_worker_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        "stage_seconds": stages,
+        "counters": dict(collector.counters),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成专利 PDF 上的 OCR 吞吐量基准测试。')
+    parser.add_argument('--data', type=str, default='./bench_data', help='合成 PDF 的存放目录，已存在的 PDF 直接复用')
+    parser.add_argument('--pdfs', type=int, default=8, help='合成 PDF 的数量，默认=8')
+    parser.add_argument('--desc_pages', type=int, default=5, help='说明书的平均页数，默认=5')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，默认=0')
+    parser.add_argument('--font', type=str, default=None, help='中文字体文件，默认在常见位置查找')
+    parser.add_argument('--scripts', nargs='+', default=list(SCRIPTS), choices=SCRIPTS, help='要测试的脚本')
+    parser.add_argument('--modes', nargs='+', default=['default'], choices=list(MODES), help='要测试的模式，默认=default')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4], help='要测试的进程数，默认=1 2 4')
+    parser.add_argument('--output', type=str, default='./bench_results.jsonl', help='结果文件（追加 JSON lines）')
+    parser.add_argument('--run_one', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        # 子进程：运行单个配置，把结果以 JSON 输出到 stdout 的最后一行
+        script, mode, workers = args.run_one.split(':')
+        result = run_one(script, mode, int(workers), args.data, os.path.join(args.data, 'out'))
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    generate_dataset(args.data, args.pdfs, find_font(args.font), seed=args.seed, desc_pages=args.desc_pages)
+    os.makedirs(os.path.join(args.data, 'out'), exist_ok=True)
+
+    info = {"commit": git_commit(), "host": platform.node(), "cpus": os.cpu_count(),
+            "python": platform.python_version(), "seed": args.seed, "time": time.time()}
+
+    for script in args.scripts:
+        for mode in args.modes:
+            for workers in args.workers:
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--data', args.data,
+                                       '--run_one', f"{script}:{mode}:{workers}"],
+                                      capture_output=True, text=True)
+                if proc.returncode != 0:
+                    print(f"{script} {mode} workers={workers} failed:\n{proc.stderr}", file=sys.stderr)
+                    continue
+                result = dict(info, **json.loads(proc.stdout.strip().splitlines()[-1]))
+                if result.get("skipped"):
+                    print(f"{script} does not support mode {mode}, skipped")
+                    continue
+                with open(args.output, 'a') as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                print(f"{script:22s} {mode:12s} workers={workers:<3d} "
+                      f"{result['pages_per_sec']:8.2f} pages/s {result['pdfs_per_sec']:8.3f} PDFs/s "
+                      f"peak worker RSS {result['peak_worker_rss_kb'] / 1024:.0f} MB  {result['stage_seconds']}")
+
+    print(f"Results have been appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ import csv
 import re
 from collections import defaultdict
 from tqdm import tqdm
+from pdf_index import PdfManifest
 
 
 # Function to clean and normalize file names
@@ -27,12 +28,34 @@ def read_patents(file_path, patent_column_index=0):
 
 
 # Function to list all the downloaded PDF files and handle duplicates
-def list_downloaded_pdfs(root_paths):
+# If manifest_paths is given (one manifest file per root path), the manifest index is
+# updated incrementally and queried instead of walking the whole tree
+def list_downloaded_pdfs(root_paths, manifest_paths=None):
     downloaded_pdfs = set()
     duplicate_paths = defaultdict(list)
     non_pdfs = []
     delete_dir_name = "delete"
 
+    if manifest_paths:
+        for root_path, manifest_path in zip(root_paths, manifest_paths):
+            manifest = PdfManifest(manifest_path, root_path)
+            manifest.update()
+            for rel_path, pnr, _, _ in manifest.iter_files():
+                # Skip anything under a "delete" directory, like the os.walk branch below
+                if any(part.lower() == delete_dir_name for part in rel_path.split(os.sep)[:-1]):
+                    continue
+                file_path = os.path.join(root_path, rel_path)
+                if pnr is not None:
+                    clean_file = clean_filename(os.path.basename(rel_path))
+                    downloaded_pdfs.add(clean_file)
+                    duplicate_paths[clean_file].append(file_path)
+                else:
+                    non_pdfs.append(file_path)
+            manifest.close()
+
+        print(f"Total unique PDF files downloaded: {len(downloaded_pdfs)}")
+        return downloaded_pdfs, duplicate_paths, non_pdfs
+
     with tqdm(total=None, desc="Scanning PDF files", unit="file") as pbar:
         for root_path in root_paths:
             for dirpath, dirs, filenames in os.walk(root_path, topdown=True):
@@ -169,11 +192,13 @@ if __name__ == "__main__":
     root_paths = ["/data/home/jdang/SIPO_PDF_B/pdf"]
     output_dir = root_paths[0]
     grant_file = "/data/home/jdang/SIPO_PDF_B/grant2406.txt"
+    # Set to a list of local manifest files (one per root path) to avoid a full os.walk
+    manifest_paths = None
 
     grant_pats = read_patents(grant_file)
 
     # Get all downloaded PDFs, duplicate PDFs, and non-PDF files
-    downloaded_pdfs, duplicate_paths, non_pdfs = list_downloaded_pdfs(root_paths)
+    downloaded_pdfs, duplicate_paths, non_pdfs = list_downloaded_pdfs(root_paths, manifest_paths)
 
     # Write report files: including mising PDFs, extra PDFs, and duplicate PDFs
     write_reports(grant_pats, downloaded_pdfs, duplicate_paths, output_dir)
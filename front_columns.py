@@ -0,0 +1,113 @@
+"""
+ 首页 / 续页的左右分栏 OCR，OCRFulltext --frontpage、reocr_patch_adaptive、reocr_second_pg 共用
+ - 可选优先使用 PDF 文本层（按固定比例裁剪），文本层不可用的栏再 OCR
+ - 分栏位置由 layout.split_columns 按投影直方图检测
+ - 自适应分辨率：先按 adaptive_dpi OCR，置信度低于 min_conf 的栏再按 dpi 重新渲染识别
+"""
+
+import ocr_engine
+from raster import render_pages
+from layout import split_columns
+from text_layer import extract_page_text, is_usable_text
+from ocr_metrics import StageTimer
+
+
+# 文本层各页左右栏的位置 (left, top, right, bottom)，页面比例，与 layout.split_columns 检测不到时的固定比例一致
+COLUMN_BOXES = {
+    1: {"left": (0, 0.165, 0.5, 1), "right": (0.5, 0.165, 1, 1)},
+    2: {"left": (0, 0, 0.5, 1), "right": (0.5, 0, 1, 1)},
+}
+
+
+def split_image(image_path, page_num=1, dpi=400, raster_mode='rgb', threshold=None):
+    """渲染第 page_num 页并切成 (左栏, 右栏)。"""
+    try:
+        img = render_pages(image_path, dpi=dpi, first_page=page_num, last_page=page_num,
+                           mode=raster_mode, threshold=threshold)[0]
+        return split_page(img, page_num)
+    except Exception as e:
+        raise RuntimeError(f"Error during image splitting: {e}")
+
+
+def split_page(img, page_num=1):
+    """把已渲染的页面切成 (左栏, 右栏) 视图；栏缝、首页题录的切分位置和空白边距由投影直方图检测。"""
+    return split_columns(img, first_page=(page_num == 1))
+
+
+def ocr_image(img):
+    try:
+        return ocr_engine.image_to_string(img, lang='chi_sim', psm=6)
+    except Exception as e:
+        raise RuntimeError(f"Error during OCR: {e}")
+
+
+def ocr_image_with_confidence(img):
+    # 返回 (文本, 单词平均置信度)，用于自适应分辨率
+    try:
+        return ocr_engine.image_to_string_with_confidence(img, lang='chi_sim', psm=6)
+    except Exception as e:
+        raise RuntimeError(f"Error during OCR: {e}")
+
+
+def ocr_columns(pdf_path, page_num, text_layer=False, dpi=400, raster_mode='rgb', threshold=None,
+                adaptive_dpi=None, min_conf=75, timer=None, image=None):
+    """
+    识别第 page_num 页（1 或 2）的左右两栏，返回 (texts, sources, dpis)，均为以 "left" / "right" 为键的字典，
+    dpis 只包含 OCR 的栏。text_layer 为 True 时优先使用文本层。
+    各阶段耗时和页数 / 字节数记到 timer（给出时）。
+    image 为已按 adaptive_dpi 或 dpi 渲染好的该页（例如 OCRFulltext --frontpage 渲染说明书时留下的），给出时不再渲染。
+    """
+    timer = timer or StageTimer()
+    texts = {}
+    sources = {}
+    dpis = {}
+    if text_layer:
+        for key, box in COLUMN_BOXES[page_num].items():
+            with timer.stage('text_layer'):
+                text = extract_page_text(pdf_path, page_num, crop=box)
+            if is_usable_text(text, min_chars=20):
+                texts[key] = text
+                sources[key] = "text"
+
+    if len(texts) < 2:
+        # 自适应模式先按 adaptive_dpi 渲染，只有置信度低的栏再按 dpi 重新渲染
+        render_dpi = adaptive_dpi or dpi
+        timer.count('pages')
+        with timer.stage('rasterize'):
+            if image is not None:
+                left_img, right_img = split_page(image, page_num)
+            else:
+                left_img, right_img = split_image(pdf_path, page_num=page_num, dpi=render_dpi,
+                                                  raster_mode=raster_mode, threshold=threshold)
+        retry = []
+        for key, img in (("left", left_img), ("right", right_img)):
+            if key in texts:
+                continue
+            timer.count('ocr_regions')
+            timer.count('image_bytes', img.nbytes)
+            if adaptive_dpi:
+                with timer.stage('ocr'):
+                    text, conf = ocr_image_with_confidence(img)
+                if conf < min_conf:
+                    retry.append(key)
+                    continue
+            else:
+                with timer.stage('ocr'):
+                    text = ocr_image(img)
+            texts[key] = text
+            sources[key] = "ocr"
+            dpis[key] = render_dpi
+
+        if retry:
+            timer.count('rerendered_regions')
+            with timer.stage('rasterize'):
+                images = dict(zip(("left", "right"), split_image(pdf_path, page_num=page_num, dpi=dpi,
+                                                                 raster_mode=raster_mode, threshold=threshold)))
+            for key in retry:
+                timer.count('image_bytes', images[key].nbytes)
+                with timer.stage('ocr'):
+                    texts[key] = ocr_image(images[key])
+                sources[key] = "ocr"
+                dpis[key] = dpi
+
+    return texts, sources, dpis
@@ -0,0 +1,130 @@
+"""
+ 版面检测：用投影直方图（每行 / 每列的墨迹像素数）找出两栏之间的空白栏缝和首页题录与正文之间的空白带，
+ 并裁掉每栏四周的空白边距，代替固定比例切分（0.165 / 0.5）
+ - 全部为 numpy 向量运算，在降采样的视图上统计，返回的分栏仍是原图的视图，不复制
+ - 检测不到时退回原来的固定比例
+"""
+
+import numpy as np
+
+from raster import otsu_threshold
+
+
+# 固定比例：首页正文起始高度、左右两栏的分界
+TOP_RATIO = 0.165
+SPLIT_RATIO = 0.5
+
+
+def ink_mask(img, step=2):
+    """
+    每隔 step 个像素取样，返回墨迹（深色）像素的布尔矩阵。
+    彩色图取各通道最小值（任一通道深即为墨迹，红色印章也算），阈值用 Otsu。
+    """
+    small = img[::step, ::step]
+    if small.ndim == 3:
+        small = small.min(axis=2)
+    if small.size == 0:
+        return np.zeros(small.shape, dtype=bool)
+    return small <= otsu_threshold(small)
+
+
+def blank_runs(profile, limit):
+    """返回 profile 中连续不超过 limit 的区间 [(start, end), ...]（end 不含）。"""
+    blank = np.concatenate(([False], profile <= limit, [False]))
+    edges = np.flatnonzero(np.diff(blank.astype(np.int8)))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _widest_gap(profile, lo, hi, limit, min_width):
+    # 在 [lo, hi) 范围内找最宽的空白区间，返回其中心；不够宽时返回 None
+    runs = [(end - start, (start + end) // 2) for start, end in blank_runs(profile[lo:hi], limit)]
+    if not runs:
+        return None
+    width, center = max(runs)
+    return lo + center if width >= min_width else None
+
+
+def find_gutter(mask, search=(0.4, 0.6), min_width=0.005, noise=0.01):
+    """
+    在 mask 的宽度 search 比例范围内找两栏之间的栏缝：每列墨迹数不超过行数 * noise 视为空白，
+    返回最宽空白区间的中心列（mask 坐标），空白区间窄于宽度 * min_width 时返回 None。
+    """
+    height, width = mask.shape
+    profile = mask.sum(axis=0)
+    return _widest_gap(profile, int(width * search[0]), int(width * search[1]),
+                       max(1, height * noise), max(1, int(width * min_width)))
+
+
+def find_top_cut(mask, search=(0.125, 0.205), min_width=0.002, noise=0.002):
+    """
+    在 mask 的高度 search 比例范围内找首页题录与正文之间的空白带，返回其中心行（mask 坐标），找不到返回 None。
+    """
+    height, width = mask.shape
+    profile = mask.sum(axis=1)
+    return _widest_gap(profile, int(height * search[0]), int(height * search[1]),
+                       max(1, width * noise), max(1, int(height * min_width)))
+
+
+def margin_box(shape, mask, step=2, pad=0.01, noise=0.002):
+    """
+    shape 为图片的 (高, 宽)，mask 为它的 ink_mask。返回去掉四周空白后的 (top, bottom, left, right)，
+    四边各留 pad 比例（至少 step 个像素）的余量；整块空白时返回 None。
+    """
+    rows = np.flatnonzero(mask.sum(axis=1) > max(1, mask.shape[1] * noise))
+    cols = np.flatnonzero(mask.sum(axis=0) > max(1, mask.shape[0] * noise))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    height, width = shape[:2]
+    pad_y = max(step, int(height * pad))
+    pad_x = max(step, int(width * pad))
+    return (max(0, rows[0] * step - pad_y), min(height, (rows[-1] + 1) * step + pad_y),
+            max(0, cols[0] * step - pad_x), min(width, (cols[-1] + 1) * step + pad_x))
+
+
+def trim_margins(img, step=2, pad=0.01, noise=0.002, mask=None):
+    """
+    裁掉四周没有墨迹的空白，四边各留 pad 比例（至少 step 个像素）的余量；整块空白时原样返回。
+    mask 为已经算好的 ink_mask(img, step)（例如整页 mask 的切片），不给出时重新计算。
+    """
+    if mask is None:
+        mask = ink_mask(img, step)
+    box = margin_box(img.shape, mask, step, pad, noise)
+    if box is None:
+        return img
+    top, bottom, left, right = box
+    return img[top:bottom, left:right]
+
+
+def column_boxes(img, first_page=True, step=2):
+    """
+    返回左右两栏在页面中的位置 [(top, bottom, left, right), ...]（像素坐标）：
+    首页先去掉题录部分（检测空白带，检测不到时按 TOP_RATIO），
+    再按检测到的栏缝（检测不到时按 SPLIT_RATIO）左右切开，最后去掉每栏的空白边距。
+    整页只统计一次墨迹，切分位置对齐到 step 的整数倍，各栏直接使用整页 mask 的切片。
+    """
+    height, width = img.shape[:2]
+    mask = ink_mask(img, step)
+
+    top = 0
+    if first_page:
+        cut = find_top_cut(mask)
+        top = cut if cut is not None else int(height * TOP_RATIO) // step
+
+    # 只在正文部分找栏缝，题录部分通常横跨整页
+    body_mask = mask[top:]
+    gutter = find_gutter(body_mask)
+    split = gutter if gutter is not None else int(width * SPLIT_RATIO) // step
+
+    boxes = []
+    for left, right, column_mask in ((0, split * step, body_mask[:, :split]),
+                                     (split * step, width, body_mask[:, split:])):
+        column_shape = (height - top * step, right - left)
+        box = margin_box(column_shape, column_mask, step) or (0, column_shape[0], 0, column_shape[1])
+        boxes.append((int(top * step + box[0]), int(top * step + box[1]), int(left + box[2]), int(left + box[3])))
+    return boxes
+
+
+def split_columns(img, first_page=True, step=2):
+    """按 column_boxes 把页面切成 (左栏, 右栏)，返回原图的视图。"""
+    (t1, b1, l1, r1), (t2, b2, l2, r2) = column_boxes(img, first_page, step)
+    return img[t1:b1, l1:r1], img[t2:b2, l2:r2]
@@ -0,0 +1,87 @@
+"""
+ OCR 结果缓存（SQLite）：以图片内容和 OCR 参数的哈希为键保存识别结果，
+ 重复的 PDF、reocr_patch_adaptive / reocr_second_pg / patch 各轮重复识别的首页和页眉直接命中，不再调用 tesseract
+ - 键：图片像素（含尺寸、通道数）+ lang + psm 的 blake2b 哈希；分辨率和裁剪区域不同时像素不同，自然对应不同的键
+ - 总大小超过上限时按最近使用时间淘汰（LRU）
+ 缓存文件建议放在本地磁盘上（SQLite 不适合放在 NFS 上）；升级 tesseract 或语言模型后应删除缓存文件
+"""
+
+import time
+import hashlib
+import sqlite3
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    text TEXT,
+    conf REAL,
+    size INTEGER,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+
+def cache_key(arr, lang, psm):
+    """uint8 数组（灰度 HxW 或彩色 HxWxC，需连续存储）和 OCR 参数的哈希。"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{arr.shape}|{lang}|{psm}|".encode())
+    h.update(memoryview(arr).cast('B'))
+    return h.hexdigest()
+
+
+class OcrCache:
+    """
+    多个工作进程共享的 OCR 结果缓存，每个进程打开自己的连接（WAL 模式，读写互不阻塞）。
+    - get(key, with_confidence): 命中返回 (text, conf)，未命中返回 None；只需要文本时带置信度的条目也可命中
+    - put(key, text, conf): 写入结果，每写入 evict_every 条检查一次总大小，超过 max_bytes 时淘汰最久未使用的条目
+    """
+
+    def __init__(self, cache_path, max_mb=1024, evict_every=100):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.evict_every = evict_every
+        self._puts = 0
+        # 多个进程同时写入时等待锁，而不是立即报 database is locked
+        self.conn = sqlite3.connect(cache_path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def get(self, key, with_confidence=False):
+        row = self.conn.execute("SELECT text, conf FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or (with_confidence and row[1] is None):
+            return None
+        self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def put(self, key, text, conf=None):
+        # 已有带置信度的条目时不用只有文本的结果覆盖
+        self.conn.execute(
+            "INSERT INTO entries (key, text, conf, size, last_used) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET text = excluded.text, conf = COALESCE(excluded.conf, conf), "
+            "size = excluded.size, last_used = excluded.last_used",
+            (key, text, conf, len(key) + len(text.encode('utf-8')) + 64, time.time()))
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """总大小超过 max_bytes 时，从最久未使用的条目开始删除，直到降到上限的 90%。"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        excess = total - int(self.max_bytes * 0.9)
+        keys = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        return len(keys)
+
+    def close(self):
+        self.conn.close()
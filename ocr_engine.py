@@ -0,0 +1,227 @@
+"""
+ OCR 后端封装
+ - pytesseract: 每张图片写临时文件并启动一次 tesseract 进程（原有方式）
+ - tesserocr: 通过 Tesseract C API 在每个工作进程内常驻引擎，直接接收 numpy 缓冲区
+ - pipe: 每张图片启动一次 tesseract，图片以 PNM 格式写入 stdin，文本从 stdout 读取，不写临时文件
+ 可选的 OCR 结果缓存（ocr_cache.OcrCache）在所有后端之前查询，命中时不调用 tesseract
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+import pytesseract
+from PIL import Image
+from ocr_cache import OcrCache, cache_key
+
+
+BACKENDS = ('pytesseract', 'tesserocr', 'pipe')
+
+_backend = 'pytesseract'
+# 单张图片 OCR 的超时（秒），None 表示不限制；对 pytesseract 和 pipe 生效，tesserocr 没有单张图片的超时，由单个 PDF 的超时兜底
+_timeout = None
+# (lang, psm) -> tesserocr.PyTessBaseAPI，每个进程内按需创建并复用
+_apis = {}
+# 本进程的 OCR 结果缓存，None 表示不使用缓存
+_cache = None
+
+
+def init_backend(backend='pytesseract', timeout=None):
+    """
+    选择当前进程使用的 OCR 后端，作为进程池的 initializer 调用。
+    tesserocr 引擎在第一次使用时加载模型，之后在本进程内一直复用。
+    timeout 为单张图片 OCR 的超时（秒），超时抛出 RuntimeError。
+    """
+    global _backend, _timeout
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {backend}")
+    if backend == 'tesserocr':
+        # 提前导入，缺少依赖时在启动阶段就报错
+        import tesserocr  # noqa: F401
+    _backend = backend
+    _timeout = timeout
+
+
+def init_cache(cache_path=None, max_mb=1024):
+    """打开当前进程的 OCR 结果缓存，作为进程池 initializer 的一部分调用；cache_path 为 None 时不使用缓存。"""
+    global _cache
+    _cache = OcrCache(cache_path, max_mb=max_mb) if cache_path else None
+
+
+def _get_api(lang, psm):
+    import tesserocr
+
+    api = _apis.get((lang, psm))
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+        _apis[(lang, psm)] = api
+    return api
+
+
+def _as_array(img):
+    # PIL 图片和 numpy 数组统一转换为 uint8 数组（灰度 HxW 或彩色 HxWxC）
+    if isinstance(img, Image.Image):
+        if img.mode not in ('L', 'RGB', 'RGBA'):
+            img = img.convert('L')
+        img = np.asarray(img)
+    if img.dtype == bool:
+        img = img.astype(np.uint8) * 255
+    return np.ascontiguousarray(img, dtype=np.uint8)
+
+
+def _set_image(api, img):
+    arr = _as_array(img)
+    height, width = arr.shape[:2]
+    bytes_per_pixel = 1 if arr.ndim == 2 else arr.shape[2]
+    api.SetImageBytes(arr.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+
+def _to_pnm(img):
+    # 灰度图编码为 PGM，彩色图编码为 PPM：像素原样拼在头部之后，不做 PNG 编码、不写文件
+    arr = _as_array(img)
+    if arr.ndim == 3 and arr.shape[2] == 4:
+        arr = np.ascontiguousarray(arr[:, :, :3])
+    height, width = arr.shape[:2]
+    magic = b'P5' if arr.ndim == 2 else b'P6'
+    return b'%s\n%d %d\n255\n' % (magic, width, height) + arr.tobytes()
+
+
+def _run_tesseract(img, lang, psm, output='stdout', extensions=()):
+    # tesseract 从 stdin 读取图片；output 为 stdout 时结果直接返回
+    cmd = [pytesseract.pytesseract.tesseract_cmd, 'stdin', output, '-l', lang, '--psm', str(psm), *extensions]
+    try:
+        result = subprocess.run(cmd, input=_to_pnm(img), capture_output=True, timeout=_timeout or None, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(e.stderr.decode('utf-8', errors='replace').strip()) from e
+    return result.stdout.decode('utf-8')
+
+
+def image_to_string(img, lang='chi_sim', psm=6):
+    """
+    OCR 单张图片（PIL 图片或 numpy 数组），返回与 pytesseract.image_to_string 相同格式的文本。
+    """
+    if _cache is None:
+        return _image_to_string(img, lang, psm)
+    arr = _as_array(img)
+    key = cache_key(arr, lang, psm)
+    hit = _cache.get(key)
+    if hit is not None:
+        return hit[0]
+    text = _image_to_string(arr, lang, psm)
+    _cache.put(key, text)
+    return text
+
+
+def _image_to_string(img, lang, psm):
+    if _backend == 'pytesseract':
+        return pytesseract.image_to_string(img, config=f'--psm {psm}', lang=lang, timeout=_timeout or 0)
+    if _backend == 'pipe':
+        return _run_tesseract(img, lang, psm)
+
+    api = _get_api(lang, psm)
+    _set_image(api, img)
+    # tesseract 命令行会在每页文本末尾追加 page_separator（默认 \f），这里保持一致
+    return api.GetUTF8Text() + '\f'
+
+
+def _mean_confidence(confidences):
+    # 没有识别出任何单词时返回 0，交给调用方按低置信度处理
+    confidences = [c for c in confidences if c >= 0]
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+def _tsv_confidences(tsv):
+    lines = tsv.splitlines()
+    if not lines:
+        return []
+    conf_index = lines[0].split('\t').index('conf')
+    confidences = []
+    for line in lines[1:]:
+        fields = line.split('\t')
+        # 只统计单词级（level 5）的置信度
+        if len(fields) > conf_index and fields[0] == '5':
+            confidences.append(float(fields[conf_index]))
+    return confidences
+
+
+def image_to_string_with_confidence(img, lang='chi_sim', psm=6):
+    """
+    OCR 单张图片，同时返回单词平均置信度 (text, mean_conf)，只识别一次。
+    text 与 image_to_string 的输出一致，mean_conf 取值 0-100。
+    """
+    if _cache is None:
+        return _image_to_string_with_confidence(img, lang, psm)
+    arr = _as_array(img)
+    key = cache_key(arr, lang, psm)
+    hit = _cache.get(key, with_confidence=True)
+    if hit is not None:
+        return hit
+    text, conf = _image_to_string_with_confidence(arr, lang, psm)
+    _cache.put(key, text, conf)
+    return text, conf
+
+
+def _image_to_string_with_confidence(img, lang, psm):
+    if _backend == 'pytesseract':
+        # 一次 tesseract 调用同时输出 txt 和 tsv
+        text, tsv = pytesseract.run_and_get_multiple_output(img, extensions=['txt', 'tsv'],
+                                                            lang=lang, config=f'--psm {psm}',
+                                                            timeout=_timeout or 0)
+        return text, _mean_confidence(_tsv_confidences(tsv))
+    if _backend == 'pipe':
+        # txt 和 tsv 两个输出无法同时写到 stdout，写到临时目录（可用 --scratch_dir 指向 tmpfs）
+        scratch = tempfile.mkdtemp(prefix='tess_')
+        try:
+            base = os.path.join(scratch, 'out')
+            _run_tesseract(img, lang, psm, output=base, extensions=('txt', 'tsv'))
+            with open(base + '.txt', encoding='utf-8') as f:
+                text = f.read()
+            with open(base + '.tsv', encoding='utf-8') as f:
+                tsv = f.read()
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        return text, _mean_confidence(_tsv_confidences(tsv))
+
+    api = _get_api(lang, psm)
+    _set_image(api, img)
+    text = api.GetUTF8Text() + '\f'
+    return text, _mean_confidence(api.AllWordConfidences())
+
+
+def _tsv_lines(tsv):
+    # 按 (block, par, line) 合并单词级记录，返回 [(文本, (left, top, right, bottom)), ...]
+    rows = [line.split('\t') for line in tsv.splitlines()]
+    if not rows:
+        return []
+    index = {name: i for i, name in enumerate(rows[0])}
+    lines = {}
+    for fields in rows[1:]:
+        if len(fields) < len(index) or fields[index['level']] != '5' or not fields[index['text']].strip():
+            continue
+        left, top = int(fields[index['left']]), int(fields[index['top']])
+        right, bottom = left + int(fields[index['width']]), top + int(fields[index['height']])
+        key = tuple(int(fields[index[name]]) for name in ('page_num', 'block_num', 'par_num', 'line_num'))
+        words, box = lines.get(key, ([], (left, top, right, bottom)))
+        words.append(fields[index['text']])
+        lines[key] = (words, (min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)))
+    return [(' '.join(words), box) for words, box in lines.values()]
+
+
+def image_to_lines(img, lang='chi_sim', psm=6):
+    """
+    OCR 单张图片，返回每一行的文本和位置 [(text, (left, top, right, bottom)), ...]（像素坐标，按识别顺序），
+    用于低分辨率探测关键字所在的区域。结果不缓存。
+    """
+    if _backend == 'pytesseract':
+        tsv = pytesseract.image_to_data(img, lang=lang, config=f'--psm {psm}', timeout=_timeout or 0)
+    elif _backend == 'pipe':
+        tsv = _run_tesseract(img, lang, psm, extensions=('tsv',))
+    else:
+        api = _get_api(lang, psm)
+        _set_image(api, img)
+        tsv = api.GetTSVText(0)
+        # GetTSVText 不带表头，补上与命令行输出相同的列名
+        tsv = ('level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t'
+               'left\ttop\twidth\theight\tconf\ttext\n') + tsv
+    return _tsv_lines(tsv)
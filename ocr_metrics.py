@@ -0,0 +1,157 @@
+"""
+ OCR 运行指标：工作进程内按阶段计时，主进程汇总成直方图并定期写出
+ - 指标文件以 .prom 结尾时写 Prometheus 文本格式（整体覆盖，适合 node_exporter textfile collector）
+ - 否则每次写出追加一行 JSON（JSON lines）
+"""
+
+import os
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# 直方图桶的上界（秒）
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float('inf'))
+
+
+class StageTimer:
+    """
+    工作进程内的计时器：记录每个阶段（rasterize / ocr / header 等）每次调用的耗时和计数，
+    as_dict() 的结果随 process_pdf 的返回值传回主进程。
+    """
+
+    def __init__(self):
+        self.observations = defaultdict(list)
+        self.counts = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observations[name].append(time.perf_counter() - start)
+
+    def iterate(self, name, iterable):
+        """包装一个迭代器，把每次取下一个元素的耗时记到 name 阶段（用于按需渲染的页面生成器）。"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observations[name].append(time.perf_counter() - start)
+            yield item
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    def merge(self, metrics):
+        """并入另一个 StageTimer.as_dict() 的结果（例如同一 PDF 的重试）。"""
+        for name, values in metrics.get("stages", {}).items():
+            self.observations[name].extend(values)
+        for name, n in metrics.get("counts", {}).items():
+            self.counts[name] += n
+
+    def as_dict(self):
+        return {"stages": dict(self.observations), "counts": dict(self.counts)}
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.total += value
+        self.n += 1
+
+
+class MetricsCollector:
+    """
+    主进程内的指标汇总器。每个 PDF 的 StageTimer 结果通过 add_task() 汇总：
+    - pdf_<stage>_seconds: 每个 PDF 在该阶段的总耗时
+    - page_<stage>_seconds: 该阶段每次调用（通常是每页）的耗时
+    - 计数器（pdfs / pages / bytes 等）直接累加
+    距上次写出超过 interval 秒时写出一次，close() 时再写出最终结果。
+    """
+
+    def __init__(self, metrics_file, interval=30.0, prefix='ocr'):
+        self.metrics_file = metrics_file
+        self.interval = interval
+        self.prefix = prefix
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+        self.started = time.time()
+        self._last_write = time.monotonic()
+
+    def observe(self, name, value):
+        self.histograms[name].observe(value)
+
+    def inc(self, name, n=1):
+        self.counters[name] += n
+
+    def add_task(self, metrics):
+        if not metrics:
+            return
+        for stage, values in metrics.get("stages", {}).items():
+            self.observe(f"pdf_{stage}_seconds", sum(values))
+            for value in values:
+                self.observe(f"page_{stage}_seconds", value)
+        for name, n in metrics.get("counts", {}).items():
+            self.inc(name, n)
+
+        if time.monotonic() - self._last_write >= self.interval:
+            self.write()
+
+    def _prometheus_text(self):
+        lines = []
+        for name, n in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {n:g}")
+        for name, hist in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS, hist.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum {hist.total:.6f}")
+            lines.append(f"{metric}_count {hist.n}")
+        return '\n'.join(lines) + '\n'
+
+    def _json_snapshot(self):
+        return {
+            "time": time.time(),
+            "elapsed": time.time() - self.started,
+            "counters": dict(self.counters),
+            "histograms": {
+                name: {"buckets": dict(zip(['+Inf' if b == float('inf') else b for b in BUCKETS], hist.buckets)),
+                       "sum": hist.total, "count": hist.n}
+                for name, hist in self.histograms.items()
+            },
+        }
+
+    def write(self):
+        if self.metrics_file.endswith('.prom'):
+            # 先写临时文件再替换，避免读取方看到写了一半的文件
+            tmp_file = self.metrics_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.write(self._prometheus_text())
+            os.replace(tmp_file, self.metrics_file)
+        else:
+            with open(self.metrics_file, 'a') as f:
+                f.write(json.dumps(self._json_snapshot()) + '\n')
+        self._last_write = time.monotonic()
+
+    def close(self):
+        self.write()
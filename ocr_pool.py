@@ -0,0 +1,279 @@
+"""
+ 进程池任务提交：限制在途任务数量，边生成任务边提交
+ - run_bounded: multiprocessing.Pool + 在途任务上限
+ - run_supervised: 自管理的工作进程，单个 PDF 超时后杀掉并替换工作进程，按任务数或内存回收工作进程
+"""
+
+import os
+import time
+import tempfile
+import threading
+import multiprocessing
+from functools import partial
+from multiprocessing.connection import wait
+
+import ocr_engine
+import raster
+
+
+def init_worker(ocr_backend='pytesseract', page_timeout=None, scratch_dir=None, ocr_cache=None, ocr_cache_mb=1024,
+                page_store=None, page_store_mb=10240):
+    """
+    工作进程的 initializer：选择 OCR 后端，设置单页渲染和单页 OCR 的超时（秒）。
+    scratch_dir 给出时，本进程及其启动的 tesseract 等子进程的临时文件都放在该目录（例如 /dev/shm）。
+    ocr_cache 给出时打开该路径的 OCR 结果缓存，总大小上限为 ocr_cache_mb（MB）。
+    page_store 给出时把渲染结果缓存在该目录，总大小上限为 page_store_mb（MB）。
+    """
+    if scratch_dir:
+        os.makedirs(scratch_dir, exist_ok=True)
+        tempfile.tempdir = scratch_dir
+        os.environ['TMPDIR'] = scratch_dir
+    ocr_engine.init_backend(ocr_backend, timeout=page_timeout)
+    ocr_engine.init_cache(ocr_cache, max_mb=ocr_cache_mb)
+    raster.init_raster(timeout=page_timeout, page_store=page_store, page_store_mb=page_store_mb)
+
+
+def process_rss(pid):
+    """从 /proc/<pid>/statm 读取进程的常驻内存（字节），读取失败（进程已退出或非 Linux）返回 None。"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def mem_available():
+    """从 /proc/meminfo 读取系统可用内存 MemAvailable（字节），读取失败返回 None。"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def run_bounded(pool, func, tasks, callback, max_inflight, on_abort=None):
+    """
+    从可迭代对象 tasks（可以是边遍历目录边产生的生成器）中逐个取任务提交到 pool，
+    同时在途的任务不超过 max_inflight 个，主进程内存不随任务总数增长。
+    每个任务完成后在结果线程中调用 callback(result)；任务抛出异常时调用 on_abort(task, reason)。
+    提交完毕后关闭并等待进程池。
+    """
+    slots = threading.BoundedSemaphore(max_inflight)
+
+    def on_result(result):
+        try:
+            callback(result)
+        finally:
+            slots.release()
+
+    def on_error(task, e):
+        try:
+            print(f"Task {task} failed: {e!r}")
+            if on_abort:
+                on_abort(task, f"worker error: {e!r}")
+        finally:
+            slots.release()
+
+    for task in tasks:
+        slots.acquire()
+        pool.apply_async(func, args=(task,), callback=on_result, error_callback=partial(on_error, task))
+
+    pool.close()
+    pool.join()
+
+
+def _worker_main(conn, func, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            conn.send((True, func(task)))
+        except Exception as e:
+            conn.send((False, repr(e)))
+
+
+class _Worker:
+    """一个工作进程及与它通信的管道，同一时间只处理一个任务。"""
+
+    def __init__(self, ctx, func, initializer, initargs):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, func, initializer, initargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.deadline = None
+        self.tasks_done = 0
+
+    def submit(self, task, timeout):
+        self.task = task
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.conn.send(task)
+
+    def stop(self):
+        # 空闲时正常退出，退不出来再强制结束
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def run_supervised(func, tasks, callback, num_processes, initializer=None, initargs=(),
+                   task_timeout=None, max_tasks_per_child=None, max_rss_mb=None, on_abort=None,
+                   max_processes=None, min_free_mb=2048, adjust_interval=5.0):
+    """
+    用 num_processes 个受监管的工作进程执行 tasks，每个工作进程同时只处理一个任务：
+    - task_timeout: 单个任务的墙钟时间上限（秒），超时的工作进程被杀掉并替换，调用 on_abort(task, reason)
+    - 工作进程意外退出（如内存不足被杀）或任务抛出异常时同样调用 on_abort(task, reason)，不会让整个运行卡住
+    - max_tasks_per_child / max_rss_mb: 工作进程处理满 N 个任务或常驻内存超过上限后，正常退出并替换
+    - max_processes: 给出时自适应调整进程数（num_processes 为初始值），每 adjust_interval 秒检查一次：
+      系统可用内存低于 min_free_mb 时暂停分配新任务并让空闲进程退出（至少保留一个在处理的任务）；
+      所有进程都在忙且可用内存扣除一个工作进程的内存（取当前最大的 RSS）后仍高于 min_free_mb 时，增加一个进程，
+      最多 max_processes 个
+    每个任务完成后在主进程中调用 callback(result)。
+    """
+    ctx = multiprocessing.get_context()
+    tasks = iter(tasks)
+    exhausted = False
+    throttled = False
+    last_adjust = time.monotonic()
+    min_free = min_free_mb * 1024 * 1024
+
+    def new_worker():
+        return _Worker(ctx, func, initializer, initargs)
+
+    def abort(worker, reason):
+        task = worker.task
+        worker.kill()
+        print(f"Task {task} aborted: {reason}")
+        if on_abort:
+            on_abort(task, reason)
+
+    def adjust():
+        # 按系统可用内存增减工作进程
+        nonlocal throttled
+        available = mem_available()
+        if available is None:
+            return
+        was_throttled, throttled = throttled, available < min_free
+        if throttled:
+            idle = [w for w in workers if w.task is None]
+            keep = (len(workers) - len(idle)) or 1
+            for worker in idle[:len(workers) - keep]:
+                worker.stop()
+                workers.remove(worker)
+            if not was_throttled:
+                print(f"Low memory ({available // 2 ** 20} MB available), throttled to {len(workers)} workers")
+        elif not exhausted and len(workers) < max_processes and all(w.task is not None for w in workers):
+            worker_rss = max((process_rss(w.process.pid) or 0 for w in workers), default=0)
+            if available - worker_rss > min_free:
+                workers.append(new_worker())
+                print(f"Scaled up to {len(workers)} workers ({available // 2 ** 20} MB available)")
+
+    workers = [new_worker() for _ in range(num_processes)]
+    try:
+        while True:
+            if max_processes and time.monotonic() - last_adjust >= adjust_interval:
+                last_adjust = time.monotonic()
+                adjust()
+
+            # 给空闲的工作进程分配任务；内存不足时只保证有一个任务在处理
+            for i, worker in enumerate(workers):
+                if throttled and any(w.task is not None for w in workers):
+                    break
+                if worker.task is None and not exhausted:
+                    task = next(tasks, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    if not worker.process.is_alive():
+                        # 空闲时退出的工作进程（例如交回结果后崩溃）直接替换
+                        worker.conn.close()
+                        workers[i] = worker = new_worker()
+                    worker.submit(task, task_timeout)
+
+            busy = [w for w in workers if w.task is not None]
+            if not busy:
+                break
+
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            if max_processes:
+                # 自适应模式下定期醒来检查内存
+                deadlines.append(last_adjust + adjust_interval)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = set(wait([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout=timeout))
+
+            for i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+
+                if worker.conn in ready:
+                    try:
+                        ok, value = worker.conn.recv()
+                    except (EOFError, OSError):
+                        worker.process.join()
+                        abort(worker, f"worker exited with code {worker.process.exitcode}")
+                        workers[i] = new_worker()
+                        continue
+                    task, worker.task = worker.task, None
+                    worker.tasks_done += 1
+                    if ok:
+                        callback(value)
+                    else:
+                        print(f"Task {task} failed: {value}")
+                        if on_abort:
+                            on_abort(task, f"worker error: {value}")
+
+                    # 回收处理任务过多或内存过大的工作进程
+                    rss = process_rss(worker.process.pid) if max_rss_mb else None
+                    if (max_tasks_per_child and worker.tasks_done >= max_tasks_per_child) or \
+                            (rss is not None and rss > max_rss_mb * 1024 * 1024):
+                        worker.stop()
+                        workers[i] = new_worker()
+                elif worker.process.sentinel in ready:
+                    worker.process.join()
+                    abort(worker, f"worker exited with code {worker.process.exitcode}")
+                    workers[i] = new_worker()
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    abort(worker, f"timeout after {task_timeout}s")
+                    workers[i] = new_worker()
+    finally:
+        for worker in workers:
+            if worker.task is None:
+                worker.stop()
+            else:
+                worker.kill()
+
+
+def run_pool(func, tasks, callback, num_processes, max_inflight=None, initializer=None, initargs=(),
+             task_timeout=None, max_tasks_per_child=None, max_rss_mb=None, on_abort=None,
+             max_processes=None, min_free_mb=2048):
+    """
+    给出 task_timeout / max_tasks_per_child / max_rss_mb / max_processes 中任意一项时使用 run_supervised，
+    否则使用 multiprocessing.Pool + run_bounded（在途任务数默认为进程数的 2 倍）。
+    """
+    if task_timeout or max_tasks_per_child or max_rss_mb or max_processes:
+        run_supervised(func, tasks, callback, num_processes, initializer=initializer, initargs=initargs,
+                       task_timeout=task_timeout, max_tasks_per_child=max_tasks_per_child,
+                       max_rss_mb=max_rss_mb, on_abort=on_abort,
+                       max_processes=max_processes, min_free_mb=min_free_mb)
+    else:
+        pool = multiprocessing.Pool(num_processes, initializer=initializer, initargs=initargs)
+        run_bounded(pool, func, tasks, callback, max_inflight or num_processes * 2, on_abort=on_abort)
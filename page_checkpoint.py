@@ -0,0 +1,85 @@
+"""
+ 页面级断点：每个 PDF 已处理页面的 (页眉, 文本, 来源, 分辨率) 逐行追加到 checkpoints/<pnr>.jsonl，
+ 工作进程中断或失败后重跑时从断点继续，不再从第一页开始；结果落盘后由主进程删除断点文件
+"""
+
+import os
+import json
+import glob
+
+
+class PageCheckpoint:
+    """
+    单个 PDF（或分段任务 part）的断点文件。第一行记录渲染 / OCR 参数 key，参数变化时旧断点作废；
+    之后每行一页：{"page": 页码, "record": [页眉, 文本, 来源, 分辨率]}。
+    同一 pnr 的所有断点文件（整份处理和各分段）在 load() 时合并，同一页以后写入的为准。
+    """
+
+    def __init__(self, checkpoint_dir, pnr, key, part=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.pnr = pnr
+        self.key = key
+        name = pnr if part is None else f"{pnr}.p{part}"
+        self.path = os.path.join(checkpoint_dir, name + ".jsonl")
+        self._file = None
+
+    def _paths(self):
+        return [os.path.join(self.checkpoint_dir, self.pnr + ".jsonl")] + \
+            sorted(glob.glob(os.path.join(glob.escape(self.checkpoint_dir), glob.escape(self.pnr) + ".p*.jsonl")))
+
+    def load(self):
+        """返回 {页码: [页眉, 文本, 来源, 分辨率]}；参数不一致的断点文件被删除。"""
+        pages = {}
+        for path in self._paths():
+            try:
+                with open(path, encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except FileNotFoundError:
+                continue
+
+            if not lines:
+                # 另一个分段任务刚创建、还没写入的文件
+                continue
+            try:
+                valid = json.loads(lines[0]).get("key") == self.key
+            except (ValueError, AttributeError):
+                valid = False
+            if not valid:
+                os.remove(path)
+                continue
+
+            for line in lines[1:]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 中断时可能留下写了一半的最后一行
+                    continue
+                pages[entry["page"]] = entry["record"]
+        return pages
+
+    def append(self, page_no, record):
+        if self._file is None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            is_new = not os.path.exists(self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if is_new:
+                self._file.write(json.dumps({"key": self.key}) + '\n')
+        self._file.write(json.dumps({"page": page_no, "record": record}, ensure_ascii=False) + '\n')
+        # 只 flush 到内核：工作进程被杀掉时已写入的页面不会丢失
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def remove_checkpoints(checkpoint_dir, pnrs):
+    """删除这些 pnr 的所有断点文件，在结果已落盘后调用。"""
+    for pnr in pnrs:
+        for path in [os.path.join(checkpoint_dir, pnr + ".jsonl")] + \
+                glob.glob(os.path.join(glob.escape(checkpoint_dir), glob.escape(pnr) + ".p*.jsonl")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
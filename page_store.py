@@ -0,0 +1,84 @@
+"""
+ 渲染结果缓存：每个 (PDF, 页码, 分辨率, 渲染模式) 渲染一次，保存为未压缩的 uint8 .npy 文件，
+ 之后 OCRFulltext / reocr_patch_adaptive / reocr_second_pg 各轮直接以内存映射读取，裁剪区域是映射的视图，不复制
+ - 键包含 PDF 的绝对路径、大小和修改时间，PDF 被替换后旧的渲染结果不再命中
+ - 总大小超过上限时按最近使用时间（命中时更新文件 mtime）淘汰
+ 多个进程共享同一目录：先写临时文件再原子替换，读取方不会看到写了一半的文件
+"""
+
+import os
+import glob
+import hashlib
+import tempfile
+import numpy as np
+
+
+class PageStore:
+    """
+    store_dir 下的渲染结果缓存，每页一个 <哈希>.npy 文件。建议放在本地磁盘或 /dev/shm。
+    - get(): 命中返回只读的内存映射数组，未命中返回 None
+    - put(): 保存一页，每写入 evict_every 页检查一次总大小，超过 max_mb 时删除最久未使用的文件
+    """
+
+    def __init__(self, store_dir, max_mb=10240, evict_every=20):
+        self.store_dir = store_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.evict_every = evict_every
+        self._puts = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, pdf_path, page_no, dpi, mode, threshold):
+        stat = os.stat(pdf_path)
+        key = f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}|{page_no}|{dpi}|{mode}|{threshold}"
+        return os.path.join(self.store_dir, hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+    def get(self, pdf_path, page_no, dpi, mode='rgb', threshold=None):
+        path = self._path(pdf_path, page_no, dpi, mode, threshold)
+        try:
+            image = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # 不存在，或在读取前刚被其他进程淘汰
+            return None
+        return image
+
+    def put(self, pdf_path, page_no, dpi, image, mode='rgb', threshold=None):
+        path = self._path(pdf_path, page_no, dpi, mode, threshold)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(image))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """总大小超过 max_bytes 时，从最久未使用的文件开始删除，直到降到上限的 90%。返回删除的文件数。"""
+        entries = []
+        for path in glob.glob(os.path.join(glob.escape(self.store_dir), '*.npy')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+
+        excess = total - int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if excess <= 0:
+                break
+            try:
+                # 其他进程已经映射的文件删除后仍可读取
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            excess -= size
+        return removed
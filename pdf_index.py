@@ -0,0 +1,224 @@
+"""
+ PDF 清单索引（SQLite）：记录 PDF 根目录下每个文件的 (pnr, 相对路径, 大小, 修改时间)
+ 第一次全量扫描建立索引，之后只重新扫描 mtime 发生变化的目录，避免每次运行都 os.walk 全部 PDF
+"""
+
+import os
+import re
+import sqlite3
+from tqdm import tqdm
+
+
+PDF_EXT_PATTERN = re.compile(r'\.pdf$', re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    relpath TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS files (
+    relpath TEXT PRIMARY KEY,
+    dir TEXT,
+    pnr TEXT,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_pnr ON files (pnr);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def pnr_from_filename(filename):
+    """PDF 文件返回去掉扩展名的 pnr，其它文件返回 None。"""
+    if not PDF_EXT_PATTERN.search(filename):
+        return None
+    return PDF_EXT_PATTERN.sub('', filename)
+
+
+class PdfManifest:
+    """
+    PDF 根目录的清单索引。索引文件建议放在本地磁盘上（SQLite 不适合放在 NFS 上）。
+
+    用法：
+        manifest = PdfManifest('./pdf_manifest.sqlite', '/data/home/jdang/SIPO_PDF_B/pdf')
+        manifest.update()
+        for rel_path in manifest.iter_pdfs(): ...
+    """
+
+    def __init__(self, manifest_path, root):
+        self.root = os.path.abspath(root)
+        self.conn = sqlite3.connect(manifest_path)
+        self.conn.executescript(SCHEMA)
+
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('root', ?)", (self.root,))
+            self.conn.commit()
+        elif row[0] != self.root:
+            raise ValueError(f"Manifest {manifest_path} was built for {row[0]}, not {self.root}")
+
+    def update(self):
+        """
+        增量更新索引：目录 mtime 未变化时跳过列目录，只检查其已知子目录；
+        mtime 变化（有文件或子目录增删）的目录重新扫描。返回重新扫描的目录数。
+        """
+        known_dirs = dict(self.conn.execute("SELECT relpath, mtime_ns FROM dirs"))
+        seen_dirs = set()
+        rescanned = 0
+        stack = ['']
+
+        with self.conn, tqdm(desc="Scanning directories", unit="dir") as pbar:
+            while stack:
+                rel_dir = stack.pop()
+                try:
+                    mtime_ns = os.stat(os.path.join(self.root, rel_dir)).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                seen_dirs.add(rel_dir)
+                pbar.update(1)
+
+                if known_dirs.get(rel_dir) == mtime_ns:
+                    # 目录内容未变化，只需继续检查已知的子目录
+                    stack.extend(r for (r,) in self.conn.execute("SELECT relpath FROM dirs WHERE parent = ?", (rel_dir,)))
+                    continue
+
+                stack.extend(self._rescan_dir(rel_dir, mtime_ns))
+                rescanned += 1
+
+            # 已经不存在的目录及其文件
+            for rel_dir in set(known_dirs) - seen_dirs:
+                self.conn.execute("DELETE FROM dirs WHERE relpath = ?", (rel_dir,))
+                self.conn.execute("DELETE FROM files WHERE dir = ?", (rel_dir,))
+
+        return rescanned
+
+    def _rescan_dir(self, rel_dir, mtime_ns):
+        # 重新扫描单个目录，更新其中的文件记录，返回子目录的相对路径
+        files = []
+        subdirs = []
+        with os.scandir(os.path.join(self.root, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(rel_path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files.append((rel_path, rel_dir, pnr_from_filename(entry.name), st.st_size, st.st_mtime_ns))
+
+        self.conn.execute("DELETE FROM files WHERE dir = ?", (rel_dir,))
+        self.conn.executemany("INSERT INTO files (relpath, dir, pnr, size, mtime_ns) VALUES (?, ?, ?, ?, ?)", files)
+        self.conn.execute("INSERT OR REPLACE INTO dirs (relpath, parent, mtime_ns) VALUES (?, ?, ?)",
+                          (rel_dir, os.path.dirname(rel_dir) if rel_dir else None, mtime_ns))
+        for subdir in subdirs:
+            # 新目录先登记，mtime 置空以保证随后会被扫描
+            self.conn.execute("INSERT OR IGNORE INTO dirs (relpath, parent, mtime_ns) VALUES (?, ?, NULL)",
+                              (subdir, rel_dir))
+        return subdirs
+
+    def iter_pdfs(self, pnrs=None):
+        """
+        按相对路径顺序 yield 所有 PDF 文件的相对路径；
+        给出 pnrs 时只 yield 这些 pnr 对应的 PDF。
+        """
+        if pnrs is not None:
+            for rel_paths in self.lookup(pnrs).values():
+                yield from rel_paths
+            return
+
+        cursor = self.conn.cursor()
+        for (rel_path,) in cursor.execute("SELECT relpath FROM files WHERE pnr IS NOT NULL ORDER BY relpath"):
+            yield rel_path
+
+    def iter_files(self):
+        """yield 所有文件的 (相对路径, pnr, 大小, mtime_ns)，非 PDF 文件的 pnr 为 None。"""
+        cursor = self.conn.cursor()
+        yield from cursor.execute("SELECT relpath, pnr, size, mtime_ns FROM files ORDER BY relpath")
+
+    def lookup(self, pnrs, chunk_size=500):
+        """查询一组 pnr 对应的 PDF 相对路径，返回 {pnr: [相对路径, ...]}，找不到的 pnr 不在结果中。"""
+        pnrs = list(pnrs)
+        found = {}
+        for i in range(0, len(pnrs), chunk_size):
+            chunk = pnrs[i:i + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            for pnr, rel_path in self.conn.execute(
+                    f"SELECT pnr, relpath FROM files WHERE pnr IN ({placeholders})", chunk):
+                found.setdefault(pnr, []).append(rel_path)
+        return found
+
+    def close(self):
+        self.conn.close()
+
+
+def read_pdflist(input_pdf_list):
+    """读取 pdflist 文件中的 pnr（第一列，分隔符为 |），保持顺序并去重。"""
+    with open(input_pdf_list, 'r') as f:
+        pnrs = (line.strip().split('|')[0] for line in f)
+        return list(dict.fromkeys(pnr for pnr in pnrs if pnr))
+
+
+def expected_relpaths(pnr):
+    """
+    按 check_pdf.move_pdfs_and_cleanup 的存放规则推算 PDF 的候选相对路径：
+    CN<前 3 位>/CN<前 5 位>/<pnr>.pdf（号码补零到 9 位），号码位数不对的放在 CN000 下。
+    另外兼容根目录就是 CN<前 3 位> 目录或 PDF 直接放在根目录下的情况。
+    """
+    filename = pnr + ".pdf"
+    candidates = []
+    match = re.match(r'(CN)(\d+)([A-Z]?)', pnr)
+    if match and len(match.group(2)) in [7, 8, 9]:
+        file_number = match.group(2).zfill(9)
+        folder_name = f"{match.group(1)}{file_number[:3]}"
+        subfolder_name = f"{match.group(1)}{file_number[:5]}"
+        candidates.append(os.path.join(folder_name, subfolder_name, filename))
+        candidates.append(os.path.join(subfolder_name, filename))
+    else:
+        candidates.append(os.path.join("CN000", filename))
+    candidates.append(filename)
+    return candidates
+
+
+def resolve_pdfs(pnrs, folder_path, missing, manifest=None, search_misses=True):
+    """
+    根据 pnr 直接推算并 stat PDF 路径，逐个 yield 找到的相对路径，不需要遍历整个目录。
+    推算不到的 pnr 最后再查 manifest（若给出），或遍历一次目录只找这些文件（search_misses=True）。
+    仍然找不到的 pnr 加入 missing 集合。
+    """
+    misses = []
+    for pnr in pnrs:
+        for rel_path in expected_relpaths(pnr):
+            if os.path.isfile(os.path.join(folder_path, rel_path)):
+                yield rel_path
+                break
+        else:
+            misses.append(pnr)
+
+    if misses and manifest is not None:
+        found = manifest.lookup(misses)
+        for pnr in misses:
+            yield from found.get(pnr, [])
+        misses = [pnr for pnr in misses if pnr not in found]
+    elif misses and search_misses:
+        targets = {pnr + ".pdf": pnr for pnr in misses}
+        found = set()
+        for root, _, files in os.walk(folder_path):
+            for file in files:
+                if file in targets:
+                    found.add(targets[file])
+                    yield os.path.relpath(os.path.join(root, file), folder_path)
+        misses = [pnr for pnr in misses if pnr not in found]
+
+    missing.update(misses)
+
+
+def write_missing(missing_file, missing):
+    """把找不到 PDF 的 pnr 写入 missingpdf.txt。"""
+    with open(missing_file, 'w') as f:
+        for pnr in sorted(missing):
+            f.write(pnr + '\n')
@@ -0,0 +1,197 @@
+"""
+ PDF 栅格化：把页面渲染为 numpy uint8 数组，可直接渲染为灰度并可选二值化，减小 OCR 输入
+ - rgb: HxWx3，与原来的 convert_from_path 输出一致
+ - gray: HxW，pdftoppm -gray 直接输出灰度，内存为 rgb 的 1/3
+ - binary: HxW，灰度图经 numpy 阈值化为 0/255
+ pdftoppm 的输出直接从 stdout 读入内存，按 PPM/PGM 头解析为指向同一缓冲区的数组，不落盘、不经过 PIL
+ iter_pages 可以在后台线程中提前渲染后续页面，与调用方的 OCR 重叠执行
+ 可选的渲染结果缓存（page_store.PageStore）：同一页面在各脚本、各轮之间只渲染一次
+"""
+
+import re
+import subprocess
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pdf2image import pdfinfo_from_path
+from page_store import PageStore
+
+
+RASTER_MODES = ('rgb', 'gray', 'binary')
+
+# 单次 pdftoppm / pdfinfo 调用的超时（秒），None 表示不限制
+_timeout = None
+# 本进程的渲染结果缓存，None 表示不使用缓存
+_store = None
+
+
+def init_raster(timeout=None, page_store=None, page_store_mb=10240):
+    """
+    设置当前进程渲染的超时，作为进程池 initializer 的一部分调用；超时抛出 subprocess.TimeoutExpired。
+    page_store 给出时把渲染结果缓存在该目录，总大小上限为 page_store_mb（MB）。
+    """
+    global _timeout, _store
+    _timeout = timeout
+    _store = PageStore(page_store, max_mb=page_store_mb) if page_store else None
+
+
+def otsu_threshold(gray):
+    """向量化的 Otsu 阈值：用灰度直方图一次算出所有候选阈值的类间方差，取最大者。"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+
+    w0 = np.cumsum(hist)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(hist * levels)
+    mean_total = m0[-1] / w0[-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean_total * w0 - m0) ** 2 / (w0 * w1)
+    # 一侧为空的阈值无效：舍入误差会让分子略大于 0，除以 0 得到 inf，不能让它成为最大值
+    between[(w0 == 0) | (w1 == 0)] = 0
+    return int(np.argmax(np.nan_to_num(between)))
+
+
+def binarize(gray, threshold=None):
+    """灰度图二值化为 0/255，threshold 为 None 或 'otsu' 时使用 Otsu 阈值。"""
+    if threshold is None or threshold == 'otsu':
+        threshold = otsu_threshold(gray)
+    return np.where(gray > int(threshold), 255, 0).astype(np.uint8)
+
+
+def to_mode(image, mode='rgb', threshold=None):
+    """把渲染出的数组转换为指定模式（rgb 为 HxWx3，gray / binary 为 HxW）。"""
+    if mode not in RASTER_MODES:
+        raise ValueError(f"Unknown raster mode: {mode}")
+
+    if mode == 'rgb':
+        return image if image.ndim == 3 else np.repeat(image[:, :, None], 3, axis=2)
+    gray = image if image.ndim == 2 else (image @ np.array([0.299, 0.587, 0.114])).astype(np.uint8)
+    if mode == 'gray':
+        return gray
+    return binarize(gray, threshold)
+
+
+PNM_HEADER_PATTERN = re.compile(rb'(P[56])\s+(?:#[^\n]*\s+)*(\d+)\s+(?:#[^\n]*\s+)*(\d+)\s+(?:#[^\n]*\s+)*(\d+)\s')
+
+
+def parse_pnm(data):
+    """
+    解析 pdftoppm 写到 stdout 的连续 PPM (P6) / PGM (P5) 图片，返回只读的 uint8 数组列表，
+    数组直接引用 data 的内存，不复制。
+    """
+    images = []
+    offset = 0
+    while offset < len(data):
+        match = PNM_HEADER_PATTERN.match(data, offset)
+        if match is None:
+            raise ValueError(f"Invalid PNM data at offset {offset}")
+        magic, width, height, maxval = match.group(1), int(match.group(2)), int(match.group(3)), int(match.group(4))
+        if maxval > 255:
+            raise ValueError(f"Unsupported PNM maxval {maxval}")
+        channels = 3 if magic == b'P6' else 1
+        count = width * height * channels
+        array = np.frombuffer(data, dtype=np.uint8, count=count, offset=match.end())
+        images.append(array.reshape((height, width, 3) if channels == 3 else (height, width)))
+        offset = match.end() + count
+    return images
+
+
+def render_pages(pdf_path, dpi=300, first_page=None, last_page=None, mode='rgb', threshold=None):
+    """
+    渲染 [first_page, last_page] 范围内的页面，返回 numpy 数组列表。
+    使用渲染结果缓存且页码范围确定时，已缓存的页面以内存映射读取，只渲染缺少的页面。
+    """
+    if _store is None or first_page is None or last_page is None:
+        return _render(pdf_path, dpi, first_page, last_page, mode, threshold)
+
+    page_numbers = range(first_page, last_page + 1)
+    images = {page_no: _store.get(pdf_path, page_no, dpi, mode, threshold) for page_no in page_numbers}
+    missing = [page_no for page_no, image in images.items() if image is None]
+    if missing:
+        # 一次 pdftoppm 渲染所有缺少的页面（中间已缓存的页面也会重新渲染，代价小于多次启动 poppler）
+        rendered = _render(pdf_path, dpi, missing[0], missing[-1], mode, threshold)
+        for page_no, image in zip(range(missing[0], missing[-1] + 1), rendered):
+            if images[page_no] is None:
+                _store.put(pdf_path, page_no, dpi, image, mode, threshold)
+                images[page_no] = image
+    # 超出页数的页码 pdftoppm 不输出，这里同样略去
+    return [images[page_no] for page_no in page_numbers if images[page_no] is not None]
+
+
+def _render(pdf_path, dpi, first_page, last_page, mode, threshold):
+    cmd = ['pdftoppm', '-r', str(dpi)]
+    if first_page is not None:
+        cmd += ['-f', str(first_page)]
+    if last_page is not None:
+        cmd += ['-l', str(last_page)]
+    if mode != 'rgb':
+        cmd.append('-gray')
+    # 不给输出文件名前缀时 pdftoppm 把图片写到 stdout
+    output = subprocess.run(cmd + [pdf_path], capture_output=True, timeout=_timeout, check=True).stdout
+    return [to_mode(image, mode, threshold) for image in parse_pnm(output)]
+
+
+def iter_pages(pdf_path, dpi=300, window=1, skip_pages=(), mode='rgb', threshold=None, first_page=1, last_page=None,
+               prefetch=0, render_threads=1, timer=None):
+    """
+    按需渲染 PDF 页面，每次只渲染 window 页，逐页 yield (页码, 图片)，页码从 1 开始。
+    调用方 break 后不会再渲染剩余页面；window<=0 时一次性渲染整个范围。
+    skip_pages 中的页面不渲染，对应的图片为 None。
+    first_page / last_page 限定页码范围，last_page 为 None 或超出页数时到最后一页为止。
+    prefetch>0 时渲染和 OCR 流水线执行：render_threads 个线程（各自启动 pdftoppm）提前渲染后续窗口，
+    最多领先 prefetch 个窗口，调用方 OCR 当前页面时下一批页面已在渲染；调用方 break 后取消尚未开始的窗口。
+    timer 给出时，每个窗口的实际渲染耗时记到 render 阶段。
+    """
+    if window <= 0:
+        images = render_pages(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page, mode=mode,
+                              threshold=threshold)
+        for page_no, image in enumerate(images, start=first_page):
+            yield page_no, (None if page_no in skip_pages else image)
+        return
+
+    page_count = pdfinfo_from_path(pdf_path, timeout=_timeout)["Pages"]
+    if last_page is not None:
+        page_count = min(page_count, last_page)
+
+    def render_window(pages):
+        if not pages:
+            return []
+        with timer.stage('render') if timer else nullcontext():
+            return render_pages(pdf_path, dpi=dpi, first_page=pages[0], last_page=pages[-1],
+                                mode=mode, threshold=threshold)
+
+    windows = []
+    for window_start in range(first_page, page_count + 1, window):
+        window_end = min(window_start + window - 1, page_count)
+        windows.append((window_start, window_end, [p for p in range(window_start, window_end + 1) if p not in skip_pages]))
+
+    executor = ThreadPoolExecutor(max(1, render_threads)) if prefetch > 0 else None
+    # 已提交渲染、尚未被取走的窗口，长度不超过 prefetch + 1
+    pending = deque()
+    try:
+        for i, (window_start, window_end, pages) in enumerate(windows):
+            if executor is None:
+                images = render_window(pages)
+            else:
+                while len(pending) <= prefetch and i + len(pending) < len(windows):
+                    pending.append(executor.submit(render_window, windows[i + len(pending)][2]))
+                images = pending.popleft().result()
+
+            for page_no in range(window_start, window_end + 1):
+                if not pages or page_no < pages[0] or page_no > pages[-1]:
+                    yield page_no, None
+                    continue
+                # 逐个弹出，已处理的页面不再被本函数引用
+                image = images.pop(0)
+                yield page_no, (None if page_no in skip_pages else image)
+    finally:
+        if executor is not None:
+            # 已经在运行的 pdftoppm 在后台结束，结果丢弃
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_threshold(value):
+    """命令行参数：'otsu' 或 0-255 的整数。"""
+    return value if value == 'otsu' else int(value)
@@ -1,90 +1,63 @@
 import os
-import json
-import numpy as np
 import pytesseract
-from pdf2image import convert_from_path
-import multiprocessing
 from tqdm import tqdm
 from functools import partial
-import sys
-
-def split_image(image_path, page_num=1):
-    try:
-        images = convert_from_path(image_path, dpi=400, first_page=page_num, last_page=page_num)
-        img = np.array(images[0])
-        img_height, img_width = img.shape[:2]
-        horizontal_split_ratio = 0.5
-
-        if page_num == 1:
-            # 第一页分栏
-            up_img = img[int(img_height * 0.13):int(img_height * 0.15), int(img_width * 0.6):int(img_width * 0.9)]
-            down_img = img[int(img_height * 0.165):, :]
-            left_img = down_img[:, :int(img_width * horizontal_split_ratio)]
-            right_img = down_img[:, int(img_width * (1 - horizontal_split_ratio)):]
-            return left_img, right_img
-        else:
-            # 第二页分栏
-            left_img = img[:, :int(img_width * horizontal_split_ratio)]
-            right_img = img[:, int(img_width * (1 - horizontal_split_ratio)):]
-            return left_img, right_img
-    except Exception as e:
-        raise RuntimeError(f"Error during image splitting: {e}")
-
-
-def ocr_image(img):
-    try:
-        # print('ocr_image begin...')
-        oem_psm_config = r'--psm 6'
-        text = pytesseract.image_to_string(img, config = oem_psm_config, lang='chi_sim')
-        # print('ocr_image end...')
-        return text
-    except Exception as e:
-        raise RuntimeError(f"Error during OCR: {e}")
-
-
-def process_pdf(pdf_file, folder_path, finished_pdfs, output_folder):
+import argparse
+import time
+import ocr_engine
+from result_sink import ResultWriter
+from ocr_pool import init_worker, run_pool
+from raster import RASTER_MODES, parse_threshold
+from front_columns import ocr_columns
+from pdf_index import PdfManifest, read_pdflist, resolve_pdfs, write_missing
+from ocr_metrics import StageTimer, MetricsCollector
+
+
+def process_pdf(pdf_file, folder_path, output_folder, text_layer=False, dpi=400, raster_mode='rgb', threshold=None,
+                adaptive_dpi=None, min_conf=75):
     # print(f'process_pdf {pdf_file} start...')
+    # Finished PNRs are filtered in the parent before submission
     pnr = os.path.basename(pdf_file).split('.')[0]
-    if pnr in finished_pdfs:
-        return None, pnr, True  # Already processed
 
     pdf_path = os.path.join(folder_path, pdf_file)
+    # Stage timings returned to the parent for the metrics file
+    timer = StageTimer()
 
+    raster_opts = dict(dpi=dpi, raster_mode=raster_mode, threshold=threshold, adaptive_dpi=adaptive_dpi, min_conf=min_conf,
+                       timer=timer)
     try:
+        timer.count('pdf_bytes', os.path.getsize(pdf_path))
         # 处理第一页
-        left_img_1, right_img_1 = split_image(pdf_path, page_num=1)
-        left_text_1 = ocr_image(left_img_1)
-        right_text_1 = ocr_image(right_img_1)
+        texts_1, sources_1, dpis_1 = ocr_columns(pdf_path, 1, text_layer=text_layer, **raster_opts)
 
         # 处理第二页
-        left_img_2, right_img_2 = split_image(pdf_path, page_num=2)
-        left_text_2 = ocr_image(left_img_2)
-        right_text_2 = ocr_image(right_img_2)
-
-        result = {"pnr": pnr, "left1": left_text_1, "right1": right_text_1, "left2": left_text_2, "right2": right_text_2}
+        texts_2, sources_2, dpis_2 = ocr_columns(pdf_path, 2, text_layer=text_layer, **raster_opts)
+
+        result = {"pnr": pnr, "left1": texts_1["left"], "right1": texts_1["right"],
+                  "left2": texts_2["left"], "right2": texts_2["right"]}
+        if text_layer:
+            result["sources"] = {"left1": sources_1["left"], "right1": sources_1["right"],
+                                 "left2": sources_2["left"], "right2": sources_2["right"]}
+        if adaptive_dpi:
+            # DPI used for each OCR'd column
+            result["dpi"] = {key + page: dpi_used for page, dpis in (("1", dpis_1), ("2", dpis_2))
+                             for key, dpi_used in dpis.items()}
      #  print(f'process_pdf {pdf_file} end...')
 
-        return result, pnr, True  # Return result, pnr, and success
+        return result, pnr, True, timer.as_dict()  # Return result, pnr, success and stage timings
 
     except Exception as e:
         print(f"Error processing {pdf_file}: {e}")
-        return None, pnr, False  # Return pnr and False to indicate failure
+        return None, pnr, False, timer.as_dict()  # Return pnr and False to indicate failure
 
 
-def get_target_pdfs(input_pdf_list, folder_path):
-    # 读取目标 PDF 文件名
-    with open(input_pdf_list, 'r') as f:
-        target_pdfs = {line.strip().split('|')[0] + ".pdf" for line in f}
-
-    pdf_files = []
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            if file in target_pdfs:
-                file_path = os.path.relpath(os.path.join(root, file), folder_path)
-                pdf_files.append(file_path)
-    return pdf_files
-
-def process_pdf_folder(folder_path, output_folder, input_pdf_list,num_processes=10):
+def process_pdf_folder(folder_path, output_folder, input_pdf_list,num_processes=10, text_layer=False,
+                       ocr_backend='pytesseract', flush_interval=5.0, max_inflight=None,
+                       manifest_path=None, dpi=400, raster_mode='rgb', threshold=None,
+                       adaptive_dpi=None, min_conf=75, metrics_file=None, metrics_interval=30.0,
+                       page_timeout=None, task_timeout=None, max_tasks_per_child=None, max_rss_mb=None,
+                       adaptive=False, max_workers=None, min_free_mb=2048, scratch_dir=None,
+                       ocr_cache=None, ocr_cache_mb=1024, page_store=None, page_store_mb=10240):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
@@ -102,42 +75,77 @@ def process_pdf_folder(folder_path, output_folder, input_pdf_list,num_processes=
         finished_pdfs = set(line.strip() for line in file.readlines())
 
     with open(failed_file, 'r') as file:
-        failed_pdfs = set(line.strip() for line in file.readlines())
+        # Failed lines may carry a reason (pnr|reason)
+        failed_pdfs = set(line.strip().split('|')[0] for line in file.readlines())
+
+    manifest = None
+    if manifest_path:
+        # Misses of the direct path lookup are searched in the manifest instead of walking the tree
+        manifest = PdfManifest(manifest_path, folder_path)
+        manifest.update()
 
-    pdf_files = get_target_pdfs(input_pdf_list, folder_path)
-    pdf_files = [os.path.join(folder_path, pdf_file) for pdf_file in pdf_files]
+    # Skip finished PNRs here so workers only receive the path of each PDF,
+    # then resolve each pnr to its expected path; missing PNRs are written at the end
+    missing_pnrs = set()
+    pnrs = [pnr for pnr in read_pdflist(input_pdf_list) if pnr not in finished_pdfs]
+    pdf_files = (os.path.join(folder_path, pdf_file)
+                 for pdf_file in resolve_pdfs(pnrs, folder_path, missing_pnrs, manifest=manifest))
 
-    pool = multiprocessing.Pool(num_processes)
-    process_pdf_partial = partial(process_pdf, folder_path=folder_path, finished_pdfs=finished_pdfs, output_folder=output_folder)
+    process_pdf_partial = partial(process_pdf, folder_path=folder_path, output_folder=output_folder, text_layer=text_layer,
+                                  dpi=dpi, raster_mode=raster_mode, threshold=threshold,
+                                  adaptive_dpi=adaptive_dpi, min_conf=min_conf)
 
-    results = []
-    completed_count = 0
+    metrics = MetricsCollector(metrics_file, interval=metrics_interval) if metrics_file else None
 
     def callback(result):
-        nonlocal completed_count
-        res, pnr, success = result
-        if res:
-            with open(json_file, 'a', encoding='utf-8') as f:
-                json.dump(res, f, ensure_ascii=False)
-                f.write('\n')
+        res, pnr, success, task_metrics = result
+        write_start = time.perf_counter()
+        writer.add(res, pnr, success)
+
+        if metrics:
+            metrics.observe('write_seconds', time.perf_counter() - write_start)
+            metrics.inc('pdfs')
+            if not success:
+                metrics.inc('failed_pdfs')
+            metrics.add_task(task_metrics)
 
         if success:
             finished_pdfs.add(pnr)
-            with open(finish_file, 'a') as f:
-                f.write(pnr + '\n')
         else:
             failed_pdfs.add(pnr)
-            with open(failed_file, 'a') as f:
-                f.write(pnr + '\n')
 
         pbar.update(1)
 
-    with tqdm(total=len(pdf_files), desc="Processing PDFs") as pbar:
-        for pdf_file in pdf_files:
-            pool.apply_async(process_pdf_partial, args=(pdf_file,), callback=callback)
+    def on_abort(pdf_file, reason):
+        # PDFs that timed out, lost their worker or raised go to the failed file with the reason
+        pnr = os.path.basename(pdf_file).split('.')[0]
+        writer.add(None, pnr, False, reason=reason)
+        failed_pdfs.add(pnr)
+
+        if metrics:
+            metrics.inc('pdfs')
+            metrics.inc('failed_pdfs')
+            metrics.inc('aborted_pdfs')
 
-        pool.close()
-        pool.join()
+        pbar.update(1)
+
+    with ResultWriter(json_file, finish_file, failed_file, flush_interval=flush_interval) as writer, \
+            tqdm(total=None, desc="Processing PDFs") as pbar:
+        run_pool(process_pdf_partial, pdf_files, callback, num_processes, max_inflight=max_inflight,
+                 initializer=init_worker,
+                 initargs=(ocr_backend, page_timeout, scratch_dir, ocr_cache, ocr_cache_mb, page_store, page_store_mb),
+                 task_timeout=task_timeout,
+                 max_tasks_per_child=max_tasks_per_child, max_rss_mb=max_rss_mb, on_abort=on_abort,
+                 max_processes=(max_workers or os.cpu_count()) if adaptive else None, min_free_mb=min_free_mb)
+
+    if metrics:
+        metrics.close()
+    if manifest:
+        manifest.close()
+
+    missing_file = os.path.join(output_folder, "missingpdf.txt")
+    write_missing(missing_file, missing_pnrs)
+    print(f"Missing PNRs have been written to {missing_file}")
 
 # Set the path for Tesseract and Poppler on BIGFORCE
 pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
@@ -145,13 +153,71 @@ poppler_path = '/usr/bin/pdftotext'
 os.environ['PATH'] += os.pathsep + poppler_path
 
 if __name__ == '__main__':
-    if len(sys.argv) < 4:
-        print("Usage: python your_script.py <pdf_folder_path> <output_folder> <input_pdf_list> [num_processes]")
-        sys.exit(1)
-
-    pdf_folder_path = sys.argv[1]
-    output_folder = sys.argv[2]
-    input_pdf_list = sys.argv[3]
-    num_processes = int(sys.argv[4]) if len(sys.argv) > 4 else 10
-
-    process_pdf_folder(pdf_folder_path, output_folder, input_pdf_list, num_processes)
+    parser = argparse.ArgumentParser(description='Re-OCR the first two pages of the PDFs in input_pdf_list.')
+    parser.add_argument('pdf_folder_path', type=str, help='Root folder of the PDF files')
+    parser.add_argument('output_folder', type=str, help='Folder for the json, finish and failed files')
+    parser.add_argument('input_pdf_list', type=str, help='PDF list file, pnr in the first |-separated column')
+    parser.add_argument('num_processes', type=int, nargs='?', default=10, help='Number of worker processes (default: 10)')
+    parser.add_argument('--text_layer', action='store_true', help='Use the embedded PDF text layer when usable, OCR otherwise')
+    parser.add_argument('--ocr_backend', type=str, default='pytesseract', choices=ocr_engine.BACKENDS,
+                        help='OCR backend: pytesseract (one tesseract process per image), tesserocr (one engine per worker) '
+                             'or pipe (tesseract over stdin/stdout, no temp files)')
+    parser.add_argument('--flush_interval', type=float, default=5.0,
+                        help='Seconds between batched result writes, <=0 writes every result at once (default: 5)')
+    parser.add_argument('--max_inflight', type=int, default=None,
+                        help='Maximum number of tasks in flight (default: 2 x num_processes)')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='Optional PDF manifest index (SQLite, keep it on local disk) used instead of walking the folder')
+    parser.add_argument('--dpi', type=int, default=400, help='Rasterization DPI (default: 400)')
+    parser.add_argument('--raster_mode', type=str, default='rgb', choices=RASTER_MODES,
+                        help='rgb, gray (rendered as grayscale) or binary (grayscale + threshold) (default: rgb)')
+    parser.add_argument('--threshold', type=parse_threshold, default='otsu',
+                        help='Threshold for binary mode, 0-255 or otsu (default: otsu)')
+    parser.add_argument('--adaptive_dpi', type=int, default=None,
+                        help='Optional low DPI: OCR at this DPI first, re-OCR columns below --min_conf at --dpi')
+    parser.add_argument('--min_conf', type=float, default=75,
+                        help='Mean word confidence (0-100) below which a column is re-OCRed at --dpi (default: 75)')
+    parser.add_argument('--metrics_file', type=str, default=None,
+                        help='Optional metrics file with per-stage timing histograms and page/byte counts; '
+                             'Prometheus text format if it ends in .prom, JSON lines otherwise')
+    parser.add_argument('--metrics_interval', type=float, default=30.0,
+                        help='Seconds between metrics file writes (default: 30)')
+    parser.add_argument('--page_timeout', type=float, default=None,
+                        help='Timeout in seconds for rendering or OCRing a single page (default: none)')
+    parser.add_argument('--task_timeout', type=float, default=None,
+                        help='Wall-clock limit in seconds per PDF; the worker is killed and pnr|reason is '
+                             'written to the failed file (default: none)')
+    parser.add_argument('--max_tasks_per_child', type=int, default=None,
+                        help='Replace a worker after it has processed N PDFs (default: never)')
+    parser.add_argument('--max_rss_mb', type=float, default=None,
+                        help='Replace a worker once its resident memory exceeds this many MB (default: no limit)')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Adapt the number of workers to free memory: start at num_processes, pause dispatch when '
+                             'memory is low and add workers up to --max_workers when it is not')
+    parser.add_argument('--max_workers', type=int, default=None,
+                        help='Upper limit on workers in adaptive mode (default: number of CPU cores)')
+    parser.add_argument('--min_free_mb', type=float, default=2048,
+                        help='System memory in MB to keep available in adaptive mode (default: 2048)')
+    parser.add_argument('--scratch_dir', type=str, default=None,
+                        help='Optional directory for temp files, e.g. /dev/shm (default: system temp dir)')
+    parser.add_argument('--ocr_cache', type=str, default=None,
+                        help='Optional OCR result cache file (SQLite, keep it on local disk), shared across runs and scripts')
+    parser.add_argument('--ocr_cache_mb', type=float, default=1024,
+                        help='Size limit of the OCR result cache in MB, least recently used entries are evicted (default: 1024)')
+    parser.add_argument('--page_store', type=str, default=None,
+                        help='Optional directory caching rendered pages as .npy files, e.g. /dev/shm/pages')
+    parser.add_argument('--page_store_mb', type=float, default=10240,
+                        help='Size limit of the rendered page cache in MB (default: 10240)')
+    args = parser.parse_args()
+
+    process_pdf_folder(args.pdf_folder_path, args.output_folder, args.input_pdf_list, args.num_processes,
+                       text_layer=args.text_layer, ocr_backend=args.ocr_backend,
+                       flush_interval=args.flush_interval, max_inflight=args.max_inflight,
+                       manifest_path=args.manifest, dpi=args.dpi, raster_mode=args.raster_mode,
+                       threshold=args.threshold, adaptive_dpi=args.adaptive_dpi, min_conf=args.min_conf,
+                       metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                       page_timeout=args.page_timeout, task_timeout=args.task_timeout,
+                       max_tasks_per_child=args.max_tasks_per_child, max_rss_mb=args.max_rss_mb,
+                       adaptive=args.adaptive, max_workers=args.max_workers, min_free_mb=args.min_free_mb,
+                       scratch_dir=args.scratch_dir, ocr_cache=args.ocr_cache, ocr_cache_mb=args.ocr_cache_mb,
+                       page_store=args.page_store, page_store_mb=args.page_store_mb)
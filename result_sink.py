@@ -0,0 +1,93 @@
+"""
+ 主进程中的结果写入器：保持 json / finish / failed 文件打开，按批次写入
+"""
+
+import os
+import json
+import time
+
+
+class ResultWriter:
+    """
+    替代回调中每条记录 open/append/close 的写法。
+
+    结果先缓存在内存中，满 batch_size 条或距上次写入超过 flush_interval 秒时统一写出。
+    写出顺序保证崩溃一致性：JSON 记录 flush + fsync 落盘之后才写 finish，
+    因此 finish 中出现的 pnr 一定已有对应的 JSON 记录；缓存中尚未写出的结果在崩溃后会被重新处理。
+    flush_interval<=0 时每条结果都立即写出。
+    on_commit(pnrs) 在每批结果写入 finish 之后调用，参数为这一批已完成的 pnr（例如用来删除断点文件）。
+    extra_json_files 为 {名称: 文件路径}，同一遍处理产生的其它记录（如首页分栏）按名称写入各自的 JSON 文件，
+    与主 JSON 文件一样在写 finish 之前落盘。
+    """
+
+    def __init__(self, json_file, finish_file, failed_file, flush_interval=5.0, batch_size=1000, on_commit=None,
+                 extra_json_files=None):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_commit = on_commit
+
+        self._json = open(json_file, 'a', encoding='utf-8')
+        self._finish = open(finish_file, 'a')
+        self._failed = open(failed_file, 'a')
+        self._extra = {name: open(path, 'a', encoding='utf-8') for name, path in (extra_json_files or {}).items()}
+
+        self._records = []
+        self._extra_records = {name: [] for name in self._extra}
+        self._finished_pnrs = []
+        self._failed_pnrs = []
+        self._last_flush = time.monotonic()
+
+    def add(self, res, pnr, success, reason=None, extra=None):
+        """
+        登记一个 PDF 的处理结果，与 process_pdf 的返回值 (res, pnr, success) 对应。
+        失败时给出 reason（如超时）的，failed 文件中写为 pnr|reason。
+        extra 为 {名称: 记录}，记录写入 extra_json_files 中同名的文件，值为 None 的跳过。
+        """
+        if res:
+            self._records.append(json.dumps(res, ensure_ascii=False))
+        for name, record in (extra or {}).items():
+            if record:
+                self._extra_records[name].append(json.dumps(record, ensure_ascii=False))
+        if success:
+            self._finished_pnrs.append(pnr)
+        else:
+            self._failed_pnrs.append(f"{pnr}|{reason}" if reason else pnr)
+
+        pending = len(self._finished_pnrs) + len(self._failed_pnrs)
+        if pending >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    @staticmethod
+    def _write_durable(f, lines):
+        if not lines:
+            return
+        f.write('\n'.join(lines) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    def flush(self):
+        # 先让 JSON 落盘，再写 finish / failed
+        self._write_durable(self._json, self._records)
+        for name, f in self._extra.items():
+            self._write_durable(f, self._extra_records[name])
+        self._write_durable(self._finish, self._finished_pnrs)
+        self._write_durable(self._failed, self._failed_pnrs)
+        if self.on_commit and self._finished_pnrs:
+            self.on_commit(self._finished_pnrs)
+
+        self._records = []
+        self._extra_records = {name: [] for name in self._extra}
+        self._finished_pnrs = []
+        self._failed_pnrs = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        for f in (self._json, self._finish, self._failed, *self._extra.values()):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,115 @@
+"""
+ 关键区域 OCR：只识别下游实际使用的首页字段，而不是整栏
+ - 先按低分辨率（probe_dpi）渲染首页，逐栏输出带位置的文本行，找出“参考文献 / 对比文件 / (56)”和“审查员”所在的行
+ - 引用文献区域：从关键字行到审查员行（没有审查员行时到栏底，并延续到下一栏 / 续页的栏顶）
+ - 审查员区域：审查员所在的一行
+ - 再按高分辨率（dpi）渲染，只 OCR 这些区域；区域位置用页面比例表示，与分辨率无关
+ 结果中的 citations 以关键字行开头，可直接作为 extract_e_raw.extract_ref 的 left 参数（right 传空字符串）
+"""
+
+import re
+
+import ocr_engine
+from layout import column_boxes
+from raster import render_pages
+from ocr_metrics import StageTimer
+
+
+CITATION_PATTERN = re.compile(r'参考文献|对比文件|\(56\)')
+EXAMINER_PATTERN = re.compile(r'[申宙审]查员')
+CONTINUATION_PATTERN = re.compile(r'续页')
+
+# 区域上下各放宽的页面高度比例，避免低分辨率定位的误差切掉半行
+REGION_PAD = 0.004
+
+
+def probe_page(pdf_path, page_no, probe_dpi=150, raster_mode='rgb', threshold=None, timer=None):
+    """
+    按 probe_dpi 渲染一页并逐栏识别文本行，返回 {栏: (栏位置, [(去掉空格的行文本, 行位置), ...])}，
+    位置均为页面比例 (top, bottom, left, right)，行按从上到下排列。
+    """
+    timer = timer or StageTimer()
+    with timer.stage('rasterize'):
+        img = render_pages(pdf_path, dpi=probe_dpi, first_page=page_no, last_page=page_no,
+                           mode=raster_mode, threshold=threshold)[0]
+    height, width = img.shape[:2]
+    columns = {}
+    for key, (top, bottom, left, right) in zip(("left", "right"), column_boxes(img, first_page=(page_no == 1))):
+        with timer.stage('probe'):
+            lines = ocr_engine.image_to_lines(img[top:bottom, left:right], lang='chi_sim', psm=6)
+        lines = sorted(((text.replace(" ", ""),
+                         ((top + y0) / height, (top + y1) / height, (left + x0) / width, (left + x1) / width))
+                        for text, (x0, y0, x1, y1) in lines), key=lambda line: line[1][0])
+        columns[key] = ((top / height, bottom / height, left / width, right / width), lines)
+    return columns
+
+
+def find_regions(columns, citation_open=False):
+    """
+    在 probe_page 的结果中按栏、从上到下找出区域，返回 ([(字段, 栏, 位置), ...], 引用文献是否延续到下一页)。
+    citation_open 为 True 表示上一页的引用文献还没有遇到审查员行，本页从第一栏栏顶开始接续。
+    """
+    regions = []
+    for key in ("left", "right"):
+        (col_top, col_bottom, col_left, col_right), lines = columns[key]
+        start = col_top if citation_open else None
+        for text, (top, bottom, _, _) in lines:
+            if start is None and CITATION_PATTERN.search(text):
+                start = top
+            if EXAMINER_PATTERN.search(text):
+                if start is not None:
+                    regions.append(("citations", key, (start, top, col_left, col_right)))
+                    start = None
+                regions.append(("examiner", key, (top, bottom, col_left, col_right)))
+                citation_open = False
+                break
+        if start is not None:
+            # 没有审查员行：引用文献到栏底为止，并延续到下一栏
+            regions.append(("citations", key, (start, col_bottom, col_left, col_right)))
+            citation_open = True
+    return regions, citation_open
+
+
+def ocr_regions(pdf_path, pnr, dpi=400, probe_dpi=150, raster_mode='rgb', threshold=None, timer=None):
+    """
+    探测首页（引用文献延续或首页出现“续页”且没有审查员行时再探测第二页），按 dpi 只 OCR 找到的区域，返回：
+    {"pnr", "citations": 引用文献文本, "examiner": 审查员行文本,
+     "regions": [{"field", "page", "column", "box": [top, bottom, left, right]（页面比例）, "text"}, ...]}
+    首页一个区域都没找到（例如低分辨率下关键字识别失败）时退回整栏 OCR，区域的 field 为 "column"。
+    """
+    timer = timer or StageTimer()
+    probe_opts = dict(probe_dpi=probe_dpi, raster_mode=raster_mode, threshold=threshold, timer=timer)
+    columns = probe_page(pdf_path, 1, **probe_opts)
+    regions, citation_open = find_regions(columns)
+    pages = [(1, regions)]
+    if not regions:
+        timer.count('roi_fallbacks')
+        pages = [(1, [("column", key, columns[key][0]) for key in ("left", "right")])]
+    elif citation_open or (not any(field == "examiner" for field, _, _ in regions) and
+                           any(CONTINUATION_PATTERN.search(text) for key in columns for text, _ in columns[key][1])):
+        timer.count('second_pages')
+        regions_2, _ = find_regions(probe_page(pdf_path, 2, **probe_opts), citation_open=citation_open)
+        pages.append((2, regions_2))
+
+    record = {"pnr": pnr, "citations": "", "examiner": "", "regions": []}
+    texts = {"citations": [], "examiner": []}
+    for page_no, page_regions in pages:
+        if not page_regions:
+            continue
+        with timer.stage('rasterize'):
+            img = render_pages(pdf_path, dpi=dpi, first_page=page_no, last_page=page_no,
+                               mode=raster_mode, threshold=threshold)[0]
+        height, width = img.shape[:2]
+        for field, key, (top, bottom, left, right) in page_regions:
+            top, bottom = max(0.0, top - REGION_PAD), min(1.0, bottom + REGION_PAD)
+            crop = img[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+            timer.count('roi_regions')
+            timer.count('image_bytes', crop.nbytes)
+            with timer.stage('ocr'):
+                text = ocr_engine.image_to_string(crop, lang='chi_sim', psm=6)
+            texts.setdefault(field, []).append(text)
+            record["regions"].append({"field": field, "page": page_no, "column": key,
+                                      "box": [round(v, 4) for v in (top, bottom, left, right)], "text": text})
+    record["citations"] = ''.join(texts["citations"])
+    record["examiner"] = ''.join(texts["examiner"]).strip()
+    return record
@@ -0,0 +1,93 @@
+"""
+ 按预估成本排序任务：页数多的 PDF 先提交（最长处理时间优先），避免运行末尾只剩一个进程在处理大文件
+ 成本用文件大小（stat 或清单索引中的大小）或页数（从 PDF 元数据中廉价读取）估计
+"""
+
+import os
+import re
+import random
+from pdf2image import pdfinfo_from_path
+
+
+COST_MODES = ('size', 'pages')
+
+LINEARIZED_PATTERN = re.compile(rb'/Linearized\b[^>]*?/N\s+(\d+)')
+COUNT_PATTERN = re.compile(rb'/Count\s+(\d+)')
+
+
+def count_pages(pdf_path, chunk_size=65536):
+    """
+    读取 PDF 的页数：先在文件头尾各 chunk_size 字节中找线性化字典的 /N 或页面树的 /Count（取最大值），
+    找不到（例如页面树在压缩的对象流中）再调用 pdfinfo。读取失败返回 None。
+    """
+    try:
+        with open(pdf_path, 'rb') as f:
+            head = f.read(chunk_size)
+            f.seek(max(0, os.fstat(f.fileno()).st_size - chunk_size))
+            tail = f.read(chunk_size)
+    except OSError:
+        return None
+
+    match = LINEARIZED_PATTERN.search(head[:2048])
+    if match:
+        return int(match.group(1))
+    counts = [int(n) for n in COUNT_PATTERN.findall(head) + COUNT_PATTERN.findall(tail)]
+    if counts:
+        return max(counts)
+
+    try:
+        return pdfinfo_from_path(pdf_path)["Pages"]
+    except Exception:
+        return None
+
+
+def estimate_pages(pdf_files, folder_path, cost='size', sizes=None, sample_size=50, seed=0):
+    """
+    预估每个 PDF 的页数，返回 [(pdf_file, 预估页数), ...]。
+    - cost='pages': 逐个读取页数
+    - cost='size': 只取文件大小（sizes 中有的直接使用，否则 stat），
+      再抽样 sample_size 个文件读取页数，按平均每页字节数换算
+    """
+    if cost not in COST_MODES:
+        raise ValueError(f"Unknown cost mode: {cost}")
+
+    pdf_files = list(pdf_files)
+    if cost == 'pages':
+        return [(pdf_file, count_pages(os.path.join(folder_path, pdf_file)) or 1) for pdf_file in pdf_files]
+
+    file_sizes = []
+    for pdf_file in pdf_files:
+        size = sizes.get(pdf_file) if sizes else None
+        if size is None:
+            try:
+                size = os.path.getsize(os.path.join(folder_path, pdf_file))
+            except OSError:
+                size = 0
+        file_sizes.append(size)
+
+    sample = random.Random(seed).sample(range(len(pdf_files)), min(sample_size, len(pdf_files)))
+    sample_bytes = sample_pages = 0
+    for i in sample:
+        pages = count_pages(os.path.join(folder_path, pdf_files[i]))
+        if pages:
+            sample_bytes += file_sizes[i]
+            sample_pages += pages
+    bytes_per_page = sample_bytes / sample_pages if sample_pages else None
+
+    return [(pdf_file, max(1, round(size / bytes_per_page)) if bytes_per_page else 1)
+            for pdf_file, size in zip(pdf_files, file_sizes)]
+
+
+def order_largest_first(pdf_files, folder_path, cost='size', sizes=None):
+    """按预估页数从大到小排序，返回 (排序后的 PDF 列表, 预估总页数)。"""
+    estimates = estimate_pages(pdf_files, folder_path, cost=cost, sizes=sizes)
+    estimates.sort(key=lambda item: item[1], reverse=True)
+    return [pdf_file for pdf_file, _ in estimates], sum(pages for _, pages in estimates)
+
+
+def print_estimate(num_pdfs, total_pages, num_processes, sec_per_page):
+    """打印预估的总页数和运行时间（按每页 sec_per_page 秒、num_processes 个进程并行估算）。"""
+    minutes = total_pages * sec_per_page / max(1, num_processes) / 60
+    duration = f"{minutes:.0f} 分钟" if minutes < 60 else f"{minutes / 60:.1f} 小时"
+    print(f"共 {num_pdfs} 个 PDF，预估 {total_pages} 页；"
+          f"按每页 {sec_per_page} 秒、{num_processes} 个进程估算，约需 {duration}。")
@@ -0,0 +1,52 @@
+"""
+ 分段模式（chunk_pages）的主进程拼接：页数超过 chunk_pages 的 PDF 拆成分段任务，各分段到齐后按所属 PDF 拼接
+ 不渲染、不调用 tesseract：替换页数查询和分段处理函数，工作进程 fork 后沿用替换后的函数；
+ spawn 启动的工作进程会重新导入原来的函数（macOS 默认），此时跳过
+"""
+
+import os
+import json
+import multiprocessing
+
+import pytest
+
+import OCRFulltext
+
+
+PAGE_COUNT = 5
+
+
+def fake_pdfinfo(pdf_path, *args, **kwargs):
+    return {"Pages": PAGE_COUNT}
+
+
+def fake_process_chunk(chunk, folder_path, **kwargs):
+    # 每页文本注明所属 PDF 和页码，第一页页眉为“说明书”
+    pdf_file, first_page, last_page = chunk
+    pnr = os.path.basename(pdf_file).split('.')[0]
+    pages = []
+    for page_no in range(first_page, (last_page or PAGE_COUNT) + 1):
+        text = f"{'说明书' if page_no == 1 else ''}[{os.path.dirname(pdf_file)}:{page_no}]"
+        pages.append([OCRFulltext.extract_header(text), text, 'ocr', None])
+    return {"chunk": chunk, "pages": pages}, pnr, True, {}
+
+
+@pytest.mark.skipif(multiprocessing.get_context().get_start_method() != 'fork',
+                    reason="workers must inherit the monkeypatched functions via fork")
+def test_same_pnr_in_different_folders(tmp_path, monkeypatch):
+    folder = tmp_path / "pdfs"
+    for sub in ("a", "b"):
+        (folder / sub).mkdir(parents=True)
+        (folder / sub / "CN1A.pdf").write_bytes(b"")
+    output = tmp_path / "out"
+    monkeypatch.setattr(OCRFulltext, "pdfinfo_from_path", fake_pdfinfo)
+    monkeypatch.setattr(OCRFulltext, "process_chunk", fake_process_chunk)
+
+    OCRFulltext.process_pdf_folder(str(folder), str(output), num_processes=2, chunk_pages=2, flush_interval=0)
+
+    with open(output / "FullText.json", encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record["description"] for record in records) == [
+        "说明书" + ''.join(f"[{sub}:{page_no}]" for page_no in range(1, PAGE_COUNT + 1)) for sub in ("a", "b")]
+    assert all(record["pnr"] == "CN1A" for record in records)
+    assert (output / "failed.txt").read_text() == ""
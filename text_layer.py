@@ -0,0 +1,76 @@
+"""
+ 读取 PDF 自带的文本层（poppler pdftotext），文本层可用时跳过 OCR
+"""
+
+import re
+import subprocess
+
+
+# 允许出现在正常文本中的字符：中文、英文、数字、空白和常见中英文标点
+USABLE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fa5a-zA-Z0-9\s，。、；：？！“”‘’（）《》【】,.;:?!()\[\]%\-+=/]')
+
+
+def extract_text_layer(pdf_path, first_page=None, last_page=None, timeout=60):
+    """
+    一次性提取整份 PDF（或 [first_page, last_page] 页码范围）的文本层，返回按页拆分的文本列表，
+    第一项为 first_page（未给出时为第 1 页）的文本。
+    每页末尾保留分页符 \\f，与 tesseract 的输出格式一致；提取失败返回空列表。
+    """
+    cmd = ['pdftotext', '-enc', 'UTF-8']
+    if first_page is not None:
+        cmd += ['-f', str(first_page)]
+    if last_page is not None:
+        cmd += ['-l', str(last_page)]
+    try:
+        output = subprocess.run(cmd + [pdf_path, '-'], capture_output=True, timeout=timeout, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+
+    pages = output.decode('utf-8', errors='replace').split('\f')[:-1]
+    return [page + '\f' for page in pages]
+
+
+def page_size(pdf_path, page, timeout=60):
+    """返回第 page 页的尺寸 (宽, 高)，单位为 pt。"""
+    output = subprocess.run(['pdfinfo', '-f', str(page), '-l', str(page), pdf_path],
+                            capture_output=True, timeout=timeout, check=True).stdout.decode('utf-8', errors='replace')
+    match = re.search(r'Page\s+\d+\s+size:\s+([\d.]+)\s+x\s+([\d.]+)', output)
+    if not match:
+        match = re.search(r'Page size:\s+([\d.]+)\s+x\s+([\d.]+)', output)
+    return float(match.group(1)), float(match.group(2))
+
+
+def extract_page_text(pdf_path, page, crop=None, timeout=60):
+    """
+    提取单页（可选裁剪区域）的文本层。
+    crop 为 (left, top, right, bottom)，取值为占页面宽高的比例，与 split_image 的切分比例对应。
+    提取失败返回空字符串。
+    """
+    cmd = ['pdftotext', '-enc', 'UTF-8', '-f', str(page), '-l', str(page)]
+    try:
+        if crop is not None:
+            # -r 72 时 -x/-y/-W/-H 的单位就是 pt
+            width, height = page_size(pdf_path, page, timeout=timeout)
+            left, top, right, bottom = crop
+            cmd += ['-r', '72',
+                    '-x', str(int(width * left)), '-y', str(int(height * top)),
+                    '-W', str(int(width * (right - left))), '-H', str(int(height * (bottom - top)))]
+        output = subprocess.run(cmd + [pdf_path, '-'], capture_output=True, timeout=timeout, check=True).stdout
+    except (OSError, subprocess.SubprocessError, AttributeError, ValueError):
+        return ''
+
+    return output.decode('utf-8', errors='replace')
+
+
+def is_usable_text(text, min_chars=50, min_ratio=0.9):
+    """
+    判断文本层是否可以代替 OCR：
+    - 去掉空白后至少 min_chars 个字符（扫描件通常没有文本层或只有零星字符）
+    - 正常字符的比例不低于 min_ratio（排除乱码、私有区字符和替换字符）
+    """
+    stripped = re.sub(r'\s+', '', text)
+    if len(stripped) < min_chars:
+        return False
+
+    usable = len(USABLE_CHAR_PATTERN.findall(stripped))
+    return usable / len(stripped) >= min_ratio